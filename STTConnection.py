@@ -2,13 +2,44 @@ import asyncio
 from datetime import datetime
 import audioop
 import io
+import itertools
+import logging
+import random
+import threading
+import time
 import wave
 
 import openai
 
+from bot_logging import get_logger
+from noise_gate import SNR_THRESHOLD_DB, NoiseGate
+from speculation import get_budget
+from model_router import get_router, retry_after_seconds, timed_call
+from transcript_filter import Transcript
+
 
 MIN_DURATION_MS = 250        # minimum audio duration to consider (ms)
-RMS_THRESHOLD = 600          # adjust: lower -> more sensitive, higher -> stricter
+# Energy gating is per speaker and relative to their noise floor, see noise_gate.py
+
+# Speculative mode: transcribe the utterance so far at every short pause in the
+# packets, and finalize after `silence_threshold` ms without packets.
+PARTIAL_GAP_MS = 200           # a pause this long (shorter than silence_threshold) triggers a partial
+PARTIAL_POLL_INTERVAL = 0.05   # seconds between end-of-speech / partial checks
+MAX_UTTERANCE_BYTES = 192000 * 15  # force a final transcript after ~15 seconds
+WATCHER_IDLE_MS = 5000         # stop the watcher after this long with nothing buffered
+
+# Utterance ids are exported to Postgres, so they must not repeat across restarts:
+# milliseconds since UTTERANCE_EPOCH in the high bits and a per-process counter
+# (random start, so processes rarely collide) in the low 12. The result stays
+# below 2**53, which the dashboard reads as a JS number.
+UTTERANCE_EPOCH = 1735689600  # 2025-01-01 UTC
+_utterance_counter = itertools.count(random.getrandbits(12))
+
+
+def _next_utterance_id():
+    ms = time.time_ns() // 1_000_000 - UTTERANCE_EPOCH * 1000
+    return ms << 12 | next(_utterance_counter) & 0xFFF
+
 
 def _pcm_duration_ms(pcm_bytes, sample_rate, channels, sample_width=2):
     samples = len(pcm_bytes) // (sample_width * channels)
@@ -17,16 +48,26 @@ def _pcm_duration_ms(pcm_bytes, sample_rate, channels, sample_width=2):
 class STTConnection:
     """Handles speech-to-text for individual users"""
     
-    def __init__(self, user, callback, loop):
+    def __init__(self, user, callback, loop, guild_id=None, partial_callback=None):
         self.user = user
         self.callback = callback
+        self.partial_callback = partial_callback  # set to enable speculative transcription
         self.loop = loop  # Store the event loop reference
+        self.guild_id = guild_id
+        self.log = get_logger(__name__, guild=guild_id, user=user.id)
         self.audio_buffer = io.BytesIO()
         self.sample_rate = 48000  # Discord's sample rate
         self.channels = 2
         self.silence_threshold = 500  # ms of silence before processing
         self.last_audio_time = None
         self.processing_audio = False
+        self.noise_gate = NoiseGate()  # adaptive noise floor, SNR gate and gain for this speaker
+        self._watcher = None         # speculative end-of-speech watcher (concurrent future)
+        self._watching = False       # guarded by _watch_lock, so a packet never finds no watcher
+        self._watch_lock = threading.Lock()
+        self._partial_task = None    # in-flight partial transcription
+        self._final_task = None      # in-flight final transcription started by the watcher
+        self._utterance_seq = 0      # bumped on every final, invalidates stale partials
         
     def process_audio(self, pcm_data):
         """Process incoming PCM audio data"""
@@ -36,11 +77,20 @@ class STTConnection:
         # Write to buffer
         self.audio_buffer.write(pcm_data)
         self.last_audio_time = datetime.now()
+        self.noise_gate.observe_frame(pcm_data)
         
-        # Debug: Show audio data info occasionally
+        # Debug: Show audio data info occasionally (1 in 100 packets, ~2 seconds)
         buffer_size = self.audio_buffer.tell()
-        if buffer_size % 32000 == 0:  # Every ~2 seconds
-            print(f"Audio buffer for {self.user.display_name}: {buffer_size} bytes")
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug("Audio buffer: %d bytes", buffer_size, extra={"sample_every": 100})
+        
+        if self.partial_callback is not None:
+            # Speculative mode: the watcher decides when the utterance is over
+            with self._watch_lock:
+                if not self._watching and self.loop and self.loop.is_running():
+                    self._watching = True
+                    self._watcher = asyncio.run_coroutine_threadsafe(self._watch_utterance(), self.loop)
+            return
         
         # If we have enough audio and there's a pause, process it
         if not self.processing_audio and buffer_size > 48000:  # ~3 seconds of audio for better transcription
@@ -48,22 +98,85 @@ class STTConnection:
             if self.loop and self.loop.is_running():
                 asyncio.run_coroutine_threadsafe(self._process_buffered_audio(), self.loop)
     
+    async def _watch_utterance(self):
+        """Transcribe a partial at each short pause, and finalize after a long one.
+
+        Keeps running while the final is transcribed and answered, so speech
+        that arrives meanwhile gets its own final instead of waiting for the
+        next packet; exits once nothing has been buffered for a while.
+        """
+        partial_size = 0  # buffer size when the last partial was taken
+        try:
+            while True:
+                await asyncio.sleep(PARTIAL_POLL_INTERVAL)
+
+                buffer_size = self.audio_buffer.tell()
+                silence_ms = (datetime.now() - self.last_audio_time).total_seconds() * 1000
+                if buffer_size == 0:
+                    partial_size = 0
+                    if silence_ms >= WATCHER_IDLE_MS:
+                        with self._watch_lock:
+                            # Re-check under the lock: a packet written since then starts no new watcher
+                            if self.audio_buffer.tell() == 0:
+                                self._watching = False
+                                return
+                    continue
+
+                if silence_ms >= self.silence_threshold or buffer_size >= MAX_UTTERANCE_BYTES:
+                    if not self.processing_audio:
+                        self._final_task = asyncio.create_task(self._process_buffered_audio())
+                        partial_size = 0
+                    continue
+
+                # A short pause where the words so far are likely stable: transcribe them once
+                partial_idle = self._partial_task is None or self._partial_task.done()
+                if partial_idle and silence_ms >= PARTIAL_GAP_MS and buffer_size > partial_size:
+                    partial_size = buffer_size
+                    self._partial_task = asyncio.create_task(
+                        self._transcribe_partial(self.audio_buffer.getvalue(), self._utterance_seq)
+                    )
+        finally:
+            self._watching = False
+
+    async def _transcribe_partial(self, audio_data, seq):
+        """Transcribe the utterance so far and hand it to the partial callback"""
+        try:
+            try:
+                rms = audioop.rms(audio_data, 2)
+            except Exception:
+                rms = 0
+            if self.noise_gate.snr_db(rms) < SNR_THRESHOLD_DB or not get_budget().try_acquire():
+                return
+
+            log = self.log.bind(utterance="partial")
+            audio_data = self.noise_gate.apply_gain(audio_data)
+            duration_ms = _pcm_duration_ms(audio_data, self.sample_rate, self.channels)
+            transcript = await self._whisper_stt(self._convert_to_wav(audio_data, log), log, duration_ms)
+            if transcript and transcript.text and seq == self._utterance_seq:
+                await self.partial_callback(self.user, transcript.text, transcript=transcript)
+        except Exception:
+            self.log.exception("Error processing partial audio")
+
     async def _process_buffered_audio(self):
         """Process buffered audio with STT"""
         if self.processing_audio:
             return
             
         self.processing_audio = True
+        self._utterance_seq += 1
         
         try:
             # Get audio data
             audio_data = self.audio_buffer.getvalue()
             self.audio_buffer = io.BytesIO()  # Reset buffer
+            frames, voiced_frames = self.noise_gate.take_utterance()
+            log = self.log.bind(utterance=_next_utterance_id())
             
-            print(f"Processing {len(audio_data)} bytes of audio from {self.user.display_name}")
+            log.debug("Processing %d bytes of audio", len(audio_data))
             
             if len(audio_data) < 3200:  # Need at least ~0.1 seconds of audio (increased threshold)
-                print(f"Audio too short ({len(audio_data)} bytes), skipping")
+                log.debug("Audio too short (%d bytes), skipping", len(audio_data))
+                self.noise_gate.reject_short()
                 self.processing_audio = False
                 return
             
@@ -75,35 +188,39 @@ class STTConnection:
                 rms = 0
 
             if duration_ms < MIN_DURATION_MS:
-                print(f"Skipping: audio too short ({duration_ms:.1f} ms)")
+                log.debug("Skipping: audio too short (%.1f ms)", duration_ms)
+                self.noise_gate.reject_short()
                 self.processing_audio = False
                 return
 
-            if rms < RMS_THRESHOLD:
-                print(f"Skipping: low energy audio (rms={rms})")
+            if not self.noise_gate.accept(rms, frames, voiced_frames):
+                log.debug("Skipping: audio too close to noise floor (rms=%d, floor=%.0f, voiced %d/%d frames)",
+                          rms, self.noise_gate.noise_floor or 0, voiced_frames, frames)
                 self.processing_audio = False
                 return
-            
+
+            audio_data = self.noise_gate.apply_gain(audio_data)
 
             # Convert to format suitable for Whisper STT
-            audio_wav = self._convert_to_wav(audio_data)
+            audio_wav = self._convert_to_wav(audio_data, log)
             
             if audio_wav is None:
-                print("Failed to create WAV file, skipping transcription")
+                log.warning("Failed to create WAV file, skipping transcription")
                 return
             
             # Use OpenAI Whisper for STT
-            text = await self._whisper_stt(audio_wav)
+            transcript = await self._whisper_stt(audio_wav, log, duration_ms)
             
-            if text and len(text.strip()) > 0:
-                await self.callback(self.user, text)
+            if transcript and len(transcript.text) > 0:
+                await self.callback(self.user, transcript.text, utterance_id=log.extra["utterance"],
+                                    transcript=transcript)
                 
-        except Exception as e:
-            print(f"Error processing audio for {self.user.display_name}: {e}")
+        except Exception:
+            self.log.exception("Error processing audio")
         finally:
             self.processing_audio = False
     
-    def _convert_to_wav(self, pcm_data):
+    def _convert_to_wav(self, pcm_data, log):
         """Convert PCM data to WAV format"""
         try:
             wav_buffer = io.BytesIO()
@@ -118,50 +235,69 @@ class STTConnection:
             
             # Debug: Check if WAV file was created properly
             wav_size = len(wav_buffer.getvalue())
-            print(f"Created WAV file: {wav_size} bytes for user {self.user.display_name}")
+            log.debug("Created WAV file: %d bytes", wav_size)
             
             if wav_size < 44:  # WAV header is 44 bytes minimum
-                print(f"Warning: WAV file too small ({wav_size} bytes)")
+                log.warning("WAV file too small (%d bytes)", wav_size)
                 return None
             
             wav_buffer.seek(0)
             return wav_buffer
             
-        except Exception as e:
-            print(f"Error creating WAV file for {self.user.display_name}: {e}")
+        except Exception:
+            log.exception("Error creating WAV file")
             return None
     
-    async def _whisper_stt(self, audio_wav):
-        """Use OpenAI Whisper for speech-to-text"""
+    async def _whisper_stt(self, audio_wav, log, duration_ms=None):
+        """Use OpenAI Whisper for speech-to-text, returns a Transcript with confidence fields"""
         try:
             if audio_wav is None:
-                print("Audio WAV is None, skipping transcription")
+                log.debug("Audio WAV is None, skipping transcription")
                 return None
                 
             audio_wav.seek(0)
             audio_data = audio_wav.read()
-            print(f"Sending {len(audio_data)} bytes to Whisper API")
+            log.debug("Sending %d bytes to Whisper API", len(audio_data))
             
             # Create a new BytesIO with proper file-like behavior
             audio_file = io.BytesIO(audio_data)
             audio_file.name = "audio.wav"  # Give it a name with .wav extension
             audio_file.seek(0)
             
-            response = await asyncio.to_thread(
-                openai.audio.transcriptions.create,
-                model="whisper-1",
-                file=audio_file,
-                response_format="text"
-            )
+            router = get_router()
+            route = router.route_stt(self.guild_id)
+            started = time.perf_counter()
+            try:
+                response, model_ms = await asyncio.to_thread(
+                    timed_call,
+                    openai.audio.transcriptions.create,
+                    model=route.model,
+                    file=audio_file,
+                    # verbose_json (whisper-1 only) includes per-segment no_speech_prob
+                    response_format="verbose_json" if route.model.startswith("whisper") else "json"
+                )
+            except openai.RateLimitError as e:
+                router.record_throttle(route, retry_after_seconds(e))
+                raise
             
-            result = response.strip()
-            print(f"Whisper transcription: '{result}'")
+            result = Transcript.from_response(response)
+            result.duration_ms = duration_ms
+            result.stt_ms = (time.perf_counter() - started) * 1000  # as the user waited for it
+            result.route = route
+            router.record(route, model_ms, log)  # without executor queueing
+            log.info("Whisper transcription: %r (no_speech_prob=%s)", result.text, result.no_speech_prob)
             return result
             
         except Exception as e:
-            print(f"Whisper STT error: {e}")
+            log.error("Whisper STT error: %s", e)
             return None
     
     def cleanup(self):
         """Clean up resources"""
+        if self._watcher is not None:
+            self._watcher.cancel()
+        if self._partial_task is not None:
+            self._partial_task.cancel()
+        if self._final_task is not None:
+            self._final_task.cancel()
         self.audio_buffer.close()
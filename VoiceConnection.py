@@ -4,16 +4,25 @@ import tempfile
 import openai
 from discord.ext import voice_recv
 from STTConnection import STTConnection
-from datetime import datetime
 import asyncio
+import time
+
+from bot_logging import get_logger
+from history import HistoryRecord
+from transcript_filter import TranscriptFilter
+from opus_playback import (OpusPacketSource, demux_ogg_opus, get_frame_cache, opus_playback_enabled,
+                           packets_fit_discord)
+from model_router import get_router, retry_after_seconds, timed_call
+from speculation import DraftReply, get_budget, normalize_transcript, speculation_enabled
 
 class VoiceConnection:
     """Manages voice connection, STT, and TTS for a guild"""
 
     def __init__(self, current_voice, guild_id, voice_client, conversation_history, bot, 
-                 personality_prompt):
-        print(personality_prompt)
+                 personality_prompt, exporter=None):
         self.guild_id = guild_id
+        self.log = get_logger(__name__, guild=guild_id)
+        self.log.debug("Personality prompt: %s", personality_prompt)
         self.voice_client = voice_client
         self.stt_connections = {}  # user_id: STTConnection
         self.is_listening = False
@@ -21,13 +30,20 @@ class VoiceConnection:
         self.bot = bot
         self.voice = current_voice
         self.personality_prompt = personality_prompt
+        self.exporter = exporter  # HistoryExporter, or None when Postgres export is off
+        self.opus_playback = opus_playback_enabled()
+        self.transcript_filter = TranscriptFilter()  # drops hallucinations and duplicates before GPT
+        self.speculative = speculation_enabled()
+        self.drafts = {}  # user_id: DraftReply started from a partial taken at a pause
+        self.draft_hits = 0  # drafts used as the reply
+        self.draft_misses = 0  # drafts discarded: superseded by a later partial or the final differed
 
     async def start_listening(self):
         """Start listening to voice channel"""
         if not self.is_listening:
             self.voice_client.listen(voice_recv.BasicSink(self.process_voice_packet))
             self.is_listening = True
-            print(f"Started listening in guild {self.guild_id}")
+            self.log.info("Started listening")
     
     def process_voice_packet(self, user, data):
         """Process incoming voice packets"""
@@ -36,41 +52,115 @@ class VoiceConnection:
             
         # Get or create STT connection for this user
         if user.id not in self.stt_connections:
-            self.stt_connections[user.id] = STTConnection(user, self.on_speech_recognized, self.bot.loop)
+            self.stt_connections[user.id] = STTConnection(
+                user, self.on_speech_recognized, self.bot.loop, guild_id=self.guild_id,
+                partial_callback=self.on_partial_speech if self.speculative else None
+            )
         
         # Send audio data to STT
         self.stt_connections[user.id].process_audio(data.pcm)
     
-    async def on_speech_recognized(self, user, text):
+    async def on_partial_speech(self, user, text, transcript=None):
+        """Start a draft reply from the partial transcript taken at a short pause"""
+        key = normalize_transcript(text)
+        if not key or self.transcript_filter.junk_reason(
+                text, getattr(transcript, "no_speech_prob", None), getattr(transcript, "avg_logprob", None),
+                getattr(transcript, "duration_ms", None)):
+            return
+
+        draft = self.drafts.get(user.id)
+        if draft and draft.key == key:
+            return  # already drafting this text
+
+        if draft:
+            # The user kept talking after the last pause
+            draft.cancel()
+            del self.drafts[user.id]
+            self.draft_misses += 1
+        if not get_budget().try_acquire():
+            self.log.debug("Speculation budget exhausted, not drafting", extra={"user": user.id})
+            return
+
+        self.log.debug("Drafting reply from partial: %s", text, extra={"user": user.id})
+        routes = {}
+        self.drafts[user.id] = DraftReply(key, asyncio.create_task(self.generate_response(text, user, routes)),
+                                          routes)
+
+    def add_history(self, record, utterance_id=None):
+        """Append a HistoryRecord to the guild history and queue it for export"""
+        self.conversation_history[self.guild_id].append(record)
+        if self.exporter:
+            self.exporter.add_turn(self.guild_id, record, utterance_id)
+
+    async def on_speech_recognized(self, user, text, utterance_id=None, transcript=None):
         """Handle recognized speech"""
         if not text.strip():
             return
             
-        print(f"{user.display_name}: {text}")
+        log = self.log.bind(user=user.id, utterance=utterance_id)
+
+        reason = self.transcript_filter.check(
+            text, getattr(transcript, "no_speech_prob", None), getattr(transcript, "avg_logprob", None),
+            getattr(transcript, "duration_ms", None), user_id=user.id
+        )
+        if reason:
+            log.info("Dropping transcript (%s): %s", reason, text)
+            draft = self.drafts.pop(user.id, None)
+            if draft is not None:
+                draft.cancel()
+            return
+
+        log.info("%s: %s", user.display_name, text)
         
         # Add to conversation history
-        self.conversation_history[self.guild_id].append({
-            "user": user.display_name,
-            "text": text,
-            "timestamp": datetime.now().isoformat()
-        })
+        self.add_history(HistoryRecord.from_user(user, text), utterance_id)
         
+        # Use the speculative draft if it was built from the same words, otherwise redo
+        response = None
+        draft_hit = False
+        routes = {}  # kind: Route actually used for this turn
+        if transcript is not None and transcript.route is not None:
+            routes["stt"] = transcript.route
+        llm_started = time.perf_counter()
+        draft = self.drafts.pop(user.id, None)
+        if draft is not None:
+            if draft.matches(text):
+                response = await draft.result()
+                draft_hit = response is not None
+                if draft_hit:
+                    routes.update(draft.routes)
+                    self.draft_hits += 1
+                    log.debug("Draft reply confirmed")
+                else:
+                    self.draft_misses += 1
+                    log.debug("Draft reply failed, generating again")
+            else:
+                draft.cancel()
+                self.draft_misses += 1
+                log.debug("Draft reply discarded, final transcript differs")
+
         # Generate response
-        response = await self.generate_response(text, user)
+        if response is None:
+            response = await self.generate_response(text, user, routes)
         
+        llm_ms = (time.perf_counter() - llm_started) * 1000
+
+        tts_ms = None
         if response:
             # Add bot response to history
-            self.conversation_history[self.guild_id].append({
-                "user": "Bot",
-                "text": response,
-                "timestamp": datetime.now().isoformat()
-            })
+            self.add_history(HistoryRecord.bot(response), utterance_id)
             
             # Speak the response
-            await self.speak_response(response)
+            tts_started = time.perf_counter()
+            await self.speak_response(response, log, routes)
+            tts_ms = (time.perf_counter() - tts_started) * 1000
+
+        if self.exporter:
+            self.exporter.add_latency(self.guild_id, user.id, utterance_id,
+                                      getattr(transcript, "stt_ms", None), llm_ms, tts_ms, draft_hit, routes)
     
-    async def generate_response(self, text, user):
-        """Generate AI response using OpenAI GPT"""
+    async def generate_response(self, text, user, routes=None):
+        """Generate AI response using OpenAI GPT; the chosen route is stored in `routes["chat"]`"""
         try:
             # Build context from conversation history
             messages = [
@@ -79,53 +169,57 @@ class VoiceConnection:
             
             # Add recent conversation history
             for msg in list(self.conversation_history[self.guild_id])[-10:]:  # Last 10 messages
-                if msg["user"] == "Bot":
-                    messages.append({"role": "assistant", "content": msg["text"]})
+                if msg.is_bot:
+                    messages.append({"role": "assistant", "content": msg.text})
                 else:
-                    messages.append({"role": "user", "content": f"{msg['user']}: {msg['text']}"})
+                    messages.append({"role": "user", "content": f"{msg.name}: {msg.text}"})
             
             # Add current message
             messages.append({"role": "user", "content": f"{user.display_name}: {text}"})
             
-            response = await asyncio.to_thread(
-                openai.chat.completions.create,
-                model="gpt-3.5-turbo",
-                messages=messages,
-                max_tokens=100,
-                temperature=0.7
-            )
-            
+            router = get_router()
+            route = router.route_chat(self.guild_id, text)
+            for attempt in range(2):
+                try:
+                    response, model_ms = await asyncio.to_thread(
+                        timed_call,
+                        openai.chat.completions.create,
+                        model=route.model,
+                        messages=messages,
+                        max_tokens=route.max_tokens,  # capped to what can be spoken quickly
+                        temperature=0.7
+                    )
+                    break
+                except openai.RateLimitError as e:
+                    # Retry once, and only on a different model than the one that just returned 429
+                    router.record_throttle(route, retry_after_seconds(e))
+                    retry = None if attempt else router.reroute_chat(route, self.guild_id, text)
+                    if retry is None:
+                        raise
+                    route = retry
+
+            router.record(route, model_ms, self.log.bind(user=user.id))
+            if routes is not None:
+                routes["chat"] = route
             return response.choices[0].message.content.strip()
             
         except Exception as e:
-            print(f"Error generating response: {e}")
+            self.log.error("Error generating response: %s", e, extra={"user": user.id})
             return None
     
-    async def speak_response(self, text):
+    async def speak_response(self, text, log=None, routes=None):
         """Convert text to speech using OpenAI TTS with anime-style voice"""
-        print(f"Bot response: {text}")
+        log = log or self.log
+        log.info("Bot response: %s", text)
         
         try:
-            # Generate TTS using OpenAI with selected voice
-            response = await asyncio.to_thread(
-                openai.audio.speech.create,
-                model="tts-1",  # Use tts-1-hd for higher quality but slower generation
-                voice=self.voice,
-                input=text,
-                response_format="mp3"
-            )
-            
-            # Get audio data
-            audio_data = response.content
-            print(f"Generated OpenAI TTS: {len(audio_data)} bytes")
-            
-            # Save to temporary file for FFmpeg
-            with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as temp_file:
-                temp_file.write(audio_data)
-                temp_file_path = temp_file.name
-            
-            # Create FFmpeg audio source from MP3
-            audio_source = discord.FFmpegPCMAudio(temp_file_path)
+            route = get_router().route_tts(self.guild_id)
+            if routes is not None:
+                routes["tts"] = route
+            if self.opus_playback:
+                audio_source, temp_file_path = await self._opus_source(text, route, log)
+            else:
+                audio_source, temp_file_path = await self._pcm_source(text, route, log)
             
             # Stop any currently playing audio
             if self.voice_client.is_playing():
@@ -134,9 +228,12 @@ class VoiceConnection:
             # Play the TTS response with cleanup callback
             def after_playing(error):
                 if error:
-                    print(f"Playback error: {error}")
+                    log.error("Playback error: %s", error)
                 else:
-                    print(f"✅ Finished playing TTS: {text}")
+                    log.debug("Finished playing TTS")
+
+                if temp_file_path is None:
+                    return
 
                 # Schedule cleanup on the bot's event loop to avoid deleting
                 # the temp file while FFmpeg still has it open.
@@ -144,23 +241,21 @@ class VoiceConnection:
                     await asyncio.sleep(0.5)
                     try:
                         os.unlink(temp_file_path)
-                        print(f"🗑️ Cleaned up TTS file")
+                        log.debug("Cleaned up TTS file")
                     except Exception as cleanup_error:
-                        print(f"Warning: Could not delete TTS file: {cleanup_error}")
+                        log.warning("Could not delete TTS file: %s", cleanup_error)
 
                 try:
                     asyncio.run_coroutine_threadsafe(_cleanup(), self.bot.loop)
                 except Exception as schedule_error:
-                    print(f"Failed scheduling TTS cleanup: {schedule_error}")
+                    log.error("Failed scheduling TTS cleanup: %s", schedule_error)
             
             # Play the audio in the voice channel
             self.voice_client.play(audio_source, after=after_playing)
-            print(f"Playing TTS in voice channel: {text}")
+            log.debug("Playing TTS in voice channel")
             
-        except Exception as e:
-            print(f"Error in OpenAI TTS: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            log.exception("Error in OpenAI TTS")
             
             # Fallback: send to text channel as before
             try:
@@ -180,12 +275,66 @@ class VoiceConnection:
                 #     print(f"🔊 Fallback TTS sent to #{text_channel.name}")
                     
             except Exception as fallback_error:
-                print(f"Fallback TTS also failed: {fallback_error}")
-                print(f"Bot response (all TTS failed): {text}")
+                log.error("Fallback TTS also failed: %s", fallback_error)
+                log.warning("Bot response (all TTS failed): %s", text)
+
+    async def _tts(self, text, route, response_format, log):
+        """Generate TTS audio bytes using OpenAI with the selected voice"""
+        router = get_router()
+        try:
+            response, model_ms = await asyncio.to_thread(
+                timed_call,
+                openai.audio.speech.create,
+                model=route.model,  # tts-1-hd is higher quality but slower; see TTS_MODELS
+                voice=self.voice,
+                input=text,
+                response_format=response_format
+            )
+        except openai.RateLimitError as e:
+            router.record_throttle(route, retry_after_seconds(e))
+            raise
+        router.record(route, model_ms, log)
+        audio_data = response.content
+        log.debug("Generated OpenAI TTS: %d bytes of %s", len(audio_data), response_format)
+        return audio_data
+
+    def _write_temp_file(self, audio_data, suffix):
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as temp_file:
+            temp_file.write(audio_data)
+            return temp_file.name
+
+    async def _pcm_source(self, text, route, log):
+        """MP3 decoded to PCM by FFmpeg; discord.py then encodes every 20 ms frame to Opus"""
+        temp_file_path = self._write_temp_file(await self._tts(text, route, "mp3", log), ".mp3")
+        return discord.FFmpegPCMAudio(temp_file_path), temp_file_path
+
+    async def _opus_source(self, text, route, log):
+        """Opus from OpenAI sent as-is, with encoded packets cached for repeated replies"""
+        cache = get_frame_cache()
+        key = (self.voice, route.model, text)
+        packets = cache.get(key) if cache else None
+        if packets is not None:
+            log.debug("TTS frame cache hit (%d packets)", len(packets))
+            return OpusPacketSource(packets), None
+
+        audio_data = await self._tts(text, route, "opus", log)
+        packets = demux_ogg_opus(audio_data)
+        if not packets_fit_discord(packets):
+            # Not 20 ms frames: let FFmpeg re-packetize once, still without a Python-side encode
+            log.debug("TTS Opus frames are not 20 ms, converting once with FFmpeg")
+            temp_file_path = self._write_temp_file(audio_data, ".ogg")
+            return discord.FFmpegOpusAudio(temp_file_path), temp_file_path
+
+        if cache:
+            cache.put(key, packets)
+        return OpusPacketSource(packets), None
 
     async def cleanup(self):
         """Clean up connections"""
         self.is_listening = False
+        for draft in self.drafts.values():
+            draft.cancel()
+        self.drafts.clear()
         for stt_conn in self.stt_connections.values():
             stt_conn.cleanup()
         self.stt_connections.clear()
\ No newline at end of file
@@ -0,0 +1,141 @@
+"""Compare CPU cost of the two TTS playback paths.
+
+pcm:  MP3 -> FFmpegPCMAudio (ffmpeg decodes to PCM) -> discord.opus.Encoder per 20 ms frame,
+      which is what discord.py's AudioPlayer does for non-Opus sources
+opus: Ogg Opus -> demux -> OpusPacketSource, packets sent as-is
+
+Both paths are driven frame by frame as fast as possible (no 20 ms pacing), and the
+CPU time of this process and of ffmpeg children is reported per second of audio.
+
+Usage:
+    python bench_playback.py                      # synthesize a test tone with ffmpeg
+    python bench_playback.py --mp3 a.mp3 --opus a.ogg
+    python bench_playback.py --openai "Hello there, this is a playback benchmark!"
+"""
+import argparse
+import os
+import resource
+import subprocess
+import tempfile
+import time
+
+import discord
+import discord.opus
+
+from opus_playback import FRAME_MS, OpusPacketSource, demux_ogg_opus, packets_fit_discord
+
+
+def _cpu():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime, children.ru_utime + children.ru_stime
+
+
+def _measure(play):
+    own_before, children_before = _cpu()
+    wall_before = time.perf_counter()
+    frames = play()
+    wall = time.perf_counter() - wall_before
+    own_after, children_after = _cpu()
+    return frames, wall, own_after - own_before, children_after - children_before
+
+
+def play_pcm(mp3_path):
+    source = discord.FFmpegPCMAudio(mp3_path)
+    encoder = discord.opus.Encoder()
+    frames = 0
+    try:
+        while True:
+            pcm = source.read()
+            if not pcm:
+                break
+            encoder.encode(pcm, encoder.SAMPLES_PER_FRAME)
+            frames += 1
+    finally:
+        source.cleanup()  # waits for ffmpeg so its CPU shows up in RUSAGE_CHILDREN
+    return frames
+
+
+def play_opus(ogg_bytes):
+    source = OpusPacketSource(demux_ogg_opus(ogg_bytes))
+    frames = 0
+    while source.read():
+        frames += 1
+    return frames
+
+
+def _synthesize(directory, seconds):
+    """Make matching MP3 and 20 ms Ogg Opus test files with ffmpeg"""
+    mp3_path = os.path.join(directory, "bench.mp3")
+    opus_path = os.path.join(directory, "bench.ogg")
+    tone = ["ffmpeg", "-loglevel", "error", "-y", "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}"]
+    subprocess.run(tone + ["-c:a", "libmp3lame", "-b:a", "64k", mp3_path], check=True)
+    subprocess.run(tone + ["-c:a", "libopus", "-frame_duration", str(FRAME_MS), opus_path], check=True)
+    return mp3_path, opus_path
+
+
+def _from_openai(directory, text, voice):
+    import openai
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    paths = []
+    for response_format, name in (("mp3", "bench.mp3"), ("opus", "bench.ogg")):
+        response = openai.audio.speech.create(model="tts-1", voice=voice, input=text,
+                                              response_format=response_format)
+        path = os.path.join(directory, name)
+        with open(path, "wb") as f:
+            f.write(response.content)
+        paths.append(path)
+    return paths
+
+
+def _report(name, results):
+    frames = results[0][0]
+    audio_s = frames * FRAME_MS / 1000
+    wall = min(r[1] for r in results)
+    own = min(r[2] for r in results)
+    children = min(r[3] for r in results)
+    print(
+        f"{name:>5}: {frames} frames ({audio_s:.1f} s audio) | "
+        f"bot CPU {own / audio_s * 1000:7.2f} ms/s | ffmpeg CPU {children / audio_s * 1000:7.2f} ms/s | "
+        f"total {(own + children) / audio_s * 1000:7.2f} ms/s | wall {wall * 1000:.1f} ms"
+    )
+    return (own + children) / audio_s
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PCM re-encode vs Opus passthrough TTS playback")
+    parser.add_argument("--mp3", help="MP3 input for the PCM path")
+    parser.add_argument("--opus", help="Ogg Opus input for the passthrough path")
+    parser.add_argument("--openai", metavar="TEXT", help="fetch both formats from OpenAI TTS for TEXT")
+    parser.add_argument("--voice", default="nova")
+    parser.add_argument("--seconds", type=float, default=10.0, help="length of the synthesized test tone")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per path; the best run is reported")
+    args = parser.parse_args()
+
+    if not discord.opus.is_loaded():
+        discord.opus._load_default()
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.mp3 and args.opus:
+            mp3_path, opus_path = args.mp3, args.opus
+        elif args.openai:
+            mp3_path, opus_path = _from_openai(directory, args.openai, args.voice)
+        else:
+            mp3_path, opus_path = _synthesize(directory, args.seconds)
+
+        with open(opus_path, "rb") as f:
+            ogg_bytes = f.read()
+        if not packets_fit_discord(demux_ogg_opus(ogg_bytes)):
+            print("Note: Opus input is not 20 ms frames; the bot would convert it once with FFmpeg instead")
+
+        pcm_cost = _report("pcm", [_measure(lambda: play_pcm(mp3_path)) for _ in range(args.repeat)])
+        opus_cost = _report("opus", [_measure(lambda: play_opus(ogg_bytes)) for _ in range(args.repeat)])
+
+    if opus_cost > 0:
+        print(f"\nOpus passthrough uses {pcm_cost / opus_cost:.0f}x less CPU per second of playback")
+
+
+if __name__ == "__main__":
+    main()
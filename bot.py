@@ -6,8 +6,13 @@ from collections import defaultdict, deque
 from dotenv import load_dotenv
 import openai
 from bot_commands import BotCommands
+from bot_logging import get_logger, setup_logging
+from loop_watchdog import LoopWatchdog
+from history_export import HistoryExporter
 
 load_dotenv()
+setup_logging()
+log = get_logger(__name__)
 
 # Enhanced intents for full voice functionality
 intents = discord.Intents.default()
@@ -16,7 +21,16 @@ intents.guilds = True
 # Note: message_content intent is privileged and must be enabled in Discord Developer Portal
 intents.message_content = True
 
-bot = commands.Bot(command_prefix=';', intents=intents)
+
+class VoiceBot(commands.Bot):
+    async def close(self):
+        await super().close()
+        # Write queued history rows (including the final turns) before the event loop goes away
+        if history_exporter:
+            await history_exporter.close()
+
+
+bot = VoiceBot(command_prefix=';', intents=intents)
 
 # Global variables for managing connections and conversations
 active_connections = {}  # guild_id: VoiceConnection
@@ -34,11 +48,19 @@ available_voices = {
 }
 
 
+# Event loop health: logs a stack sample whenever the loop blocks longer than the threshold
+loop_watchdog = LoopWatchdog(threshold=float(os.getenv("LOOP_LAG_THRESHOLD_MS", 250)) / 1000)
+
+# Optional export of conversation turns and latencies to the dashboard's Postgres
+history_exporter = HistoryExporter.from_env()
+
 commands_handler = BotCommands(
     active_connections,
     conversation_history,
     available_voices,
-    current_voice
+    current_voice,
+    watchdog=loop_watchdog,
+    exporter=history_exporter
 )
 
 # OpenAI configuration
@@ -48,20 +70,26 @@ openai.api_key = os.getenv("OPENAI_API_KEY")
 
 @bot.event
 async def on_ready():
-    print(f"🤖 {bot.user.name} is online and ready for voice interactions!")
-    print(f"📋 Guilds: {len(bot.guilds)}")
+    loop_watchdog.start()
+    if history_exporter:
+        try:
+            await history_exporter.start()
+        except Exception:
+            log.exception("Failed to start history export")
+    log.info("%s is online and ready for voice interactions", bot.user.name)
+    log.info("Guilds: %d", len(bot.guilds))
     
     # List guilds for debugging
     for guild in bot.guilds:
-        print(f"   - {guild.name} (ID: {guild.id})")
+        log.info("Guild %s", guild.name, extra={"guild": guild.id})
     
     # Sync slash commands
     try:
         synced = await bot.tree.sync()
-        print(f"✅ Synced {len(synced)} slash command(s) globally")
+        log.info("Synced %d slash command(s) globally", len(synced))
                 
-    except Exception as e:
-        print(f"❌ Failed to sync commands: {e}")
+    except Exception:
+        log.exception("Failed to sync commands")
 
 @bot.event
 async def on_voice_state_update(member, before, after):
@@ -130,9 +158,10 @@ async def on_app_command_error(interaction: discord.Interaction, error: discord.
         else:
             await interaction.response.send_message(embed=embed, ephemeral=True)
         
-        print(f"Command error in {interaction.command.name}: {error}")
+        log.error("Command error in %s: %s", interaction.command.name, error,
+                  exc_info=error.original, extra={"guild": interaction.guild_id})
     else:
-        print(f"Unhandled error: {error}")
+        log.error("Unhandled command error: %s", error, extra={"guild": interaction.guild_id})
 
 # Graceful shutdown
 @bot.event
@@ -140,6 +169,11 @@ async def on_disconnect():
     """Clean up on disconnect"""
     for guild_id in list(active_connections.keys()):
         await commands_handler.leave_voice_channel(guild_id)
+    if history_exporter:
+        try:
+            await history_exporter.flush()
+        except Exception:
+            log.exception("History export flush on disconnect failed")
 
 if __name__ == "__main__":
     # Check for required environment variables
@@ -147,9 +181,10 @@ if __name__ == "__main__":
     missing_vars = [var for var in required_vars if not os.getenv(var)]
     
     if missing_vars:
-        print(f"❌ Missing required environment variables: {', '.join(missing_vars)}")
-        print("Please set these in your .env file")
+        log.error("Missing required environment variables: %s", ", ".join(missing_vars))
+        log.error("Please set these in your .env file")
         # exit(1)
     
-    print("🚀 Starting Discord Voice AI Bot with OpenAI Whisper...")
-    bot.run(os.getenv("DISCORD_TOKEN"))
\ No newline at end of file
+    log.info("Starting Discord Voice AI Bot with OpenAI Whisper...")
+    # Logging is already routed through setup_logging(); skip discord.py's own handler
+    bot.run(os.getenv("DISCORD_TOKEN"), log_handler=None)
\ No newline at end of file
@@ -4,15 +4,24 @@ from datetime import datetime
 from discord.ext import voice_recv
 from VoiceConnection import VoiceConnection
 from buttons import Menu, VoiceSelect
+from bot_logging import dropped_records, get_logger
+from history import HistoryRecord
+from model_router import get_router
+from speculation import get_budget
+
+log = get_logger(__name__)
 
 class BotCommands:
     """Encapsulates all voice-related command logic."""
 
-    def __init__(self, active_connections, conversation_history, available_voices, current_voice="default"):
+    def __init__(self, active_connections, conversation_history, available_voices, current_voice="default",
+                 watchdog=None, exporter=None):
         self.active_connections = active_connections
         self.conversation_history = conversation_history
         self.available_voices = available_voices
         self.current_voice = current_voice
+        self.watchdog = watchdog  # LoopWatchdog, reported in /status
+        self.exporter = exporter  # HistoryExporter shared by all voice connections, or None
         self.default_personality = "You are Dufu, a cute and friendly anime-style AI assistant in a Discord voice channel. Speak in a cheerful, energetic way like an anime character. Keep responses brief (1-2 sentences) and very engaging. You're speaking out loud, so avoid markdown formatting. Be enthusiastic and kawaii!"
 
     # -----------------------------
@@ -40,7 +49,7 @@ class BotCommands:
                 await connection.voice_client.disconnect()
 
             del self.active_connections[guild_id]
-            print(f"🚪 Left voice channel in guild {guild_id}")
+            log.info("Left voice channel", extra={"guild": guild_id})
 
     # -----------------------------
     # Command Logic
@@ -71,7 +80,8 @@ class BotCommands:
             if not permissions.connect or not permissions.speak:
                 return await interaction.followup.send("❌ I need permission to connect and speak in that voice channel!")
 
-            print(f"🔗 Connecting to {voice_channel.name} in {interaction.guild.name}...")
+            log.info("Connecting to %s in %s...", voice_channel.name, interaction.guild.name,
+                     extra={"guild": guild_id})
 
             try:
                 voice_client = await asyncio.wait_for(
@@ -89,12 +99,13 @@ class BotCommands:
                 voice_client,
                 self.conversation_history,
                 interaction.client,
-                self.default_personality
+                self.default_personality,
+                exporter=self.exporter
             )
             self.active_connections[guild_id] = connection
 
             await connection.start_listening()
-            print(f"✅ Connected and listening in {voice_channel.name}")
+            log.info("Connected and listening in %s", voice_channel.name, extra={"guild": guild_id})
 
             embed = discord.Embed(
                 title="🎙️ Voice AI Active!",
@@ -108,9 +119,7 @@ class BotCommands:
             await interaction.followup.send(embed=embed)
 
         except Exception as e:
-            print(f"❌ Error in join command: {e}")
-            import traceback
-            traceback.print_exc()
+            log.exception("Error in join command", extra={"guild": guild_id})
             await interaction.followup.send(f"❌ Error: {str(e)}")
 
     async def leave_voice(self, interaction: discord.Interaction):
@@ -133,7 +142,7 @@ class BotCommands:
             await interaction.response.send_message(embed=embed)
 
         except Exception as e:
-            print(f"Error leaving voice channel: {e}")
+            log.error("Error leaving voice channel: %s", e, extra={"guild": guild_id})
             await interaction.response.send_message(f"❌ Error leaving channel: {str(e)}")
 
     async def show_history(self, interaction: discord.Interaction):
@@ -152,8 +161,7 @@ class BotCommands:
         recent_messages = list(history)[-10:]
         history_text = ""
         for msg in recent_messages:
-            timestamp = datetime.fromisoformat(msg["timestamp"]).strftime("%H:%M")
-            history_text += f"**{msg['user']}** ({timestamp}): {msg['text']}\n"
+            history_text += f"**{msg.name}** ({msg.format_time()}): {msg.text}\n"
 
         if len(history_text) > 4000:
             history_text = history_text[:4000] + "...\n*[Truncated]*"
@@ -184,12 +192,43 @@ class BotCommands:
                 users = ", ".join([f"<@{uid}>" for uid in connection.stt_connections.keys()])
                 embed.add_field(name="🎙️ Active Speakers", value=users, inline=False)
 
+                gate_stats = [stt.noise_gate.stats() for stt in connection.stt_connections.values()]
+                embed.add_field(
+                    name="🎚️ Noise Gate",
+                    value=f"Accepted: {sum(g['accepted'] for g in gate_stats)}\n"
+                          f"Rejected (noise): {sum(g['rejected_noise'] for g in gate_stats)}\n"
+                          f"Rejected (too short): {sum(g['rejected_short'] for g in gate_stats)}\n"
+                          f"Noise floors: " + ", ".join(f"{g['noise_floor']:.0f}" for g in gate_stats),
+                    inline=False
+                )
+
+            transcript_filter = connection.transcript_filter
+            dropped = sum(transcript_filter.rejected.values())
+            reasons = ", ".join(f"{reason}: {count}" for reason, count in transcript_filter.rejected.most_common())
+            embed.add_field(
+                name="🧹 Transcript Filter",
+                value=f"Passed: {transcript_filter.passed}\n"
+                      f"Dropped: {dropped}" + (f" ({reasons})" if reasons else ""),
+                inline=False
+            )
+
+            if connection.speculative:
+                budget = get_budget()
+                embed.add_field(
+                    name="🔮 Speculation",
+                    value=f"Drafts used: {connection.draft_hits}\n"
+                          f"Drafts discarded: {connection.draft_misses}\n"
+                          f"Speculative calls (all guilds): {budget.spent}, "
+                          f"denied by cap: {budget.denied}",
+                    inline=False
+                )
+
             history = self.conversation_history.get(guild_id, [])
             if history:
                 embed.add_field(
                     name="💬 Conversation Stats",
                     value=f"Messages: {len(history)}\n"
-                          f"Last activity: <t:{int(datetime.fromisoformat(history[-1]['timestamp']).timestamp())}:R>",
+                          f"Last activity: <t:{int(history[-1].wall_time())}:R>",
                     inline=False
                 )
         else:
@@ -199,6 +238,29 @@ class BotCommands:
                 inline=False
             )
 
+        router_stats = get_router().stats()
+        if router_stats["latency_ms"]:
+            embed.add_field(
+                name="🧭 Model Routing",
+                value=f"Tier: {get_router().tier_for(guild_id)}\n"
+                      + "\n".join(f"{model}: {ms:.0f} ms" for model, ms in router_stats["latency_ms"].items())
+                      + (f"\nThrottled: {', '.join(router_stats['throttled'])}" if router_stats["throttled"] else ""),
+                inline=False
+            )
+
+        if self.watchdog:
+            loop_stats = self.watchdog.metrics()
+            embed.add_field(
+                name="⏱️ Event Loop",
+                value=f"Lag: {loop_stats['lag_ms']:.1f} ms (p99 {loop_stats['lag_p99_ms']:.1f} ms, "
+                      f"max {loop_stats['lag_max_ms']:.1f} ms)\n"
+                      f"Pending tasks: {loop_stats['pending_tasks']}\n"
+                      f"Stalls: {loop_stats['stalls']}\n"
+                      f"Active guilds: {len(self.active_connections)}\n"
+                      f"Dropped log records: {dropped_records()}",
+                inline=False
+            )
+
         await interaction.response.send_message(embed=embed, ephemeral=True)
 
     async def change_voice(self, interaction: discord.Interaction, voice: str = None):
@@ -263,11 +325,7 @@ class BotCommands:
             connection.personality_prompt = prompt
 
             # record system message in history
-            self.conversation_history[guild_id].append({
-                "user": "System",
-                "text": f"Personality changed to: {prompt}",
-                "timestamp": datetime.now().isoformat()
-            })
+            connection.add_history(HistoryRecord.system(f"Personality changed to: {prompt}"))
 
             msg = f"✅ Prompt:\n'{prompt}'\nupdated for the active call and added to conversation history."
             try:
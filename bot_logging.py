@@ -0,0 +1,167 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+# Environment configuration:
+#   LOG_LEVEL        default level for every logger (INFO)
+#   LOG_LEVELS       per-module overrides, e.g. "STTConnection=DEBUG,VoiceConnection=WARNING"
+#   LOG_FORMAT       "text" (key=value pairs) or "json"
+#   LOG_QUEUE_SIZE   max records buffered before new ones are dropped
+DEFAULT_QUEUE_SIZE = 10000
+
+# Structured fields picked up from `extra=` and printed with every record
+CONTEXT_FIELDS = ("guild", "user", "utterance")
+
+_listener = None
+_handler = None
+
+
+class ContextAdapter(logging.LoggerAdapter):
+    """LoggerAdapter that merges its bound context with per-call `extra=` values"""
+
+    def process(self, msg, kwargs):
+        kwargs["extra"] = {**self.extra, **kwargs.get("extra", {})}
+        return msg, kwargs
+
+    def bind(self, **context):
+        """Return a new adapter with additional context fields"""
+        return ContextAdapter(self.logger, {**self.extra, **context})
+
+
+def get_logger(name, **context):
+    """Get a logger for `name` with optional bound guild/user/utterance context"""
+    return ContextAdapter(logging.getLogger(name), context)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep 1 in N records for call sites that pass `extra={"sample_every": N}`.
+
+    Counting is per (logger, message template), so a chatty debug line on the
+    per-packet path is thinned out without affecting other messages.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        every = getattr(record, "sample_every", None)
+        if not every or every <= 1:
+            return True
+
+        key = (record.name, record.msg)
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        return count % every == 0
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks the caller; records are dropped when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting happens on the listener thread; only resolve the message
+        # here so mutable args cannot change before the record is written.
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class StructuredFormatter(logging.Formatter):
+    """Render records as key=value pairs (or JSON) including the context fields"""
+
+    def __init__(self, fmt="text"):
+        super().__init__()
+        self.fmt = fmt
+
+    def format(self, record):
+        fields = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+                  + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+        }
+        for name in CONTEXT_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                fields[name] = value
+        fields["msg"] = record.getMessage()
+        if record.exc_info:
+            fields["exc"] = self.formatException(record.exc_info)
+
+        if self.fmt == "json":
+            return json.dumps(fields, ensure_ascii=False, default=str)
+        return " ".join(f"{key}={_quote(value)}" for key, value in fields.items())
+
+
+def _quote(value):
+    value = str(value)
+    if not value or any(c in value for c in ' "=\n'):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _parse_levels(spec):
+    """Parse "module=LEVEL,module2=LEVEL" into a dict"""
+    levels = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        name, level = item.split("=", 1)
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging():
+    """Install the queue-backed handler on the root logger. Safe to call more than once."""
+    global _listener, _handler
+    if _listener is not None:
+        return _handler
+
+    root = logging.getLogger()
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    for name, level in _parse_levels(os.getenv("LOG_LEVELS")).items():
+        logging.getLogger(name).setLevel(level)
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(StructuredFormatter(os.getenv("LOG_FORMAT", "text").lower()))
+
+    log_queue = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", DEFAULT_QUEUE_SIZE)))
+    _handler = NonBlockingQueueHandler(log_queue)
+    _handler.addFilter(SamplingFilter())
+    root.addHandler(_handler)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _handler
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def dropped_records():
+    """Number of records dropped because the log queue was full"""
+    return _handler.dropped if _handler else 0
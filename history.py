@@ -0,0 +1,53 @@
+import sys
+import time
+
+# Wall-clock anchor for converting monotonic timestamps at render time
+_WALL_AT_START = time.time()
+_MONO_AT_START = time.monotonic()
+
+
+class HistoryRecord:
+    """A single conversation turn.
+
+    Stores the speaker id, an interned display name and the time as a
+    monotonic float; formatting into strings only happens when rendered.
+    """
+
+    __slots__ = ("role", "user_id", "name", "text", "ts")
+
+    USER = "user"
+    ASSISTANT = "assistant"
+    SYSTEM = "system"
+
+    def __init__(self, role, text, user_id=None, name=None, ts=None):
+        self.role = role
+        self.user_id = user_id
+        self.name = sys.intern(name) if name else None
+        self.text = text
+        self.ts = time.monotonic() if ts is None else ts
+
+    @classmethod
+    def from_user(cls, user, text):
+        return cls(cls.USER, text, user_id=user.id, name=user.display_name)
+
+    @classmethod
+    def bot(cls, text):
+        return cls(cls.ASSISTANT, text, name="Bot")
+
+    @classmethod
+    def system(cls, text):
+        return cls(cls.SYSTEM, text, name="System")
+
+    @property
+    def is_bot(self):
+        return self.role == self.ASSISTANT
+
+    def wall_time(self):
+        """Unix timestamp of this record"""
+        return _WALL_AT_START + (self.ts - _MONO_AT_START)
+
+    def format_time(self, fmt="%H:%M"):
+        return time.strftime(fmt, time.localtime(self.wall_time()))
+
+    def __repr__(self):
+        return f"HistoryRecord({self.role!r}, {self.name!r}, {self.text!r})"
@@ -0,0 +1,208 @@
+import asyncio
+import contextlib
+import os
+from datetime import datetime, timezone
+
+from bot_logging import get_logger
+
+try:
+    import asyncpg
+except ImportError:  # optional: only needed when DATABASE_URL is set
+    asyncpg = None
+
+log = get_logger(__name__)
+
+# Environment configuration:
+#   DATABASE_URL            Postgres DSN shared with the web dashboard; export is off when unset
+#   HISTORY_EXPORT_BATCH    rows per COPY
+#   HISTORY_EXPORT_QUEUE    rows buffered in memory before new ones are dropped
+FLUSH_INTERVAL = 1.0
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_QUEUE_SIZE = 20000
+MAX_COPY_FAILURES = 3  # after this many failed COPYs of a batch, insert its rows one at a time
+
+# Tables are created by the web app's drizzle migrations (web/db/migrations)
+TURN_COLUMNS = ("guild_id", "utterance_id", "role", "user_id", "user_name", "content", "created_at")
+LATENCY_COLUMNS = ("guild_id", "user_id", "utterance_id", "stt_ms", "llm_ms", "tts_ms", "total_ms",
+                   "draft_hit", "stt_model", "chat_model", "tts_model", "created_at")
+
+
+def _utc(timestamp):
+    """Naive UTC datetime for `timestamp` columns"""
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+
+class HistoryExporter:
+    """Batches conversation turns and latency records into Postgres.
+
+    `add_turn` / `add_latency` are cheap appends callable from the event loop;
+    a background task drains them every second with COPY over a small pool.
+    """
+
+    def __init__(self, dsn, batch_size=DEFAULT_BATCH_SIZE, max_queued=DEFAULT_QUEUE_SIZE):
+        self.dsn = dsn
+        self.batch_size = batch_size
+        self.max_queued = max_queued
+        self.pool = None
+        self.turns = []
+        self.latencies = []
+        self.exported = 0
+        self.dropped = 0  # rows not queued because the queue was full
+        self.rejected = 0  # rows the database refused, e.g. text containing NUL
+        self.copy_failures = {}  # table: consecutive failed COPYs of its oldest batch
+        self._task = None
+        self._flush_lock = asyncio.Lock()  # the flush loop, on_disconnect and close() may overlap
+
+    @classmethod
+    def from_env(cls):
+        """Exporter configured from the environment, or None if export is disabled"""
+        dsn = os.getenv("DATABASE_URL")
+        if not dsn:
+            return None
+        if asyncpg is None:
+            log.warning("DATABASE_URL is set but asyncpg is not installed, history export disabled")
+            return None
+        return cls(
+            dsn,
+            batch_size=int(os.getenv("HISTORY_EXPORT_BATCH", DEFAULT_BATCH_SIZE)),
+            max_queued=int(os.getenv("HISTORY_EXPORT_QUEUE", DEFAULT_QUEUE_SIZE)),
+        )
+
+    async def start(self):
+        """Open the pool and start the flush task. Safe to call again (e.g. on reconnect)."""
+        if self._task is not None and not self._task.done():
+            return
+        if self.pool is None:
+            self.pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=4)
+        self._task = asyncio.create_task(self._flush_loop())
+        log.info("History export to Postgres started")
+
+    async def close(self):
+        """Stop the flush task, write whatever is still queued and close the pool"""
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            log.exception("Final history export flush failed, %d rows lost",
+                          len(self.turns) + len(self.latencies))
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    def _queue(self, rows, row):
+        if len(self.turns) + len(self.latencies) >= self.max_queued:
+            self.dropped += 1
+            return
+        rows.append(row)
+
+    def add_turn(self, guild_id, record, utterance_id=None):
+        """Queue a HistoryRecord for export"""
+        self._queue(self.turns, (
+            str(guild_id),
+            utterance_id,
+            record.role,
+            str(record.user_id) if record.user_id is not None else None,
+            record.name,
+            record.text,
+            _utc(record.wall_time()),
+        ))
+
+    def add_latency(self, guild_id, user_id, utterance_id, stt_ms, llm_ms, tts_ms, draft_hit=False, routes=None):
+        """Queue per-utterance stage timings (milliseconds, None if a stage did not run)
+        and the models the router chose for each stage"""
+        routes = routes or {}
+        models = [routes[kind].model if kind in routes else None for kind in ("stt", "chat", "tts")]
+        total_ms = sum(ms for ms in (stt_ms, llm_ms, tts_ms) if ms is not None)
+        self._queue(self.latencies, (
+            str(guild_id),
+            str(user_id),
+            utterance_id,
+            stt_ms,
+            llm_ms,
+            tts_ms,
+            total_ms,
+            draft_hit,
+            *models,
+            datetime.now(timezone.utc).replace(tzinfo=None),
+        ))
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception:
+                log.exception("History export flush failed")
+
+    async def flush(self):
+        """Write everything queued so far, `batch_size` rows per COPY.
+
+        A failed COPY leaves the batch queued for the next flush. Once the same
+        batch has failed MAX_COPY_FAILURES times its rows are inserted one at a
+        time, so a single bad row cannot block the queue.
+        """
+        async with self._flush_lock:
+            # Checked under the lock: close() may have closed the pool while this call waited
+            if self.pool is not None:
+                await self._flush()
+
+    async def _flush(self):
+        for table, columns, rows in (
+            ("conversation_turn", TURN_COLUMNS, self.turns),
+            ("utterance_latency", LATENCY_COLUMNS, self.latencies),
+        ):
+            while rows:
+                batch = rows[:self.batch_size]
+                try:
+                    async with self.pool.acquire() as conn:
+                        await conn.copy_records_to_table(table, records=batch, columns=columns)
+                    written = len(batch)
+                except Exception:
+                    failures = self.copy_failures.get(table, 0) + 1
+                    self.copy_failures[table] = failures
+                    if failures < MAX_COPY_FAILURES:
+                        raise
+                    log.warning("COPY into %s failed %d times, inserting %d rows one at a time",
+                                table, failures, len(batch))
+                    written = await self._insert_rows(table, columns, batch)
+                # Only remove once written, so a failed COPY is retried on the next flush
+                self.copy_failures[table] = 0
+                del rows[:len(batch)]
+                self.exported += written
+
+    async def _insert_rows(self, table, columns, batch):
+        """Insert rows individually, dropping (and logging) the ones the database rejects.
+
+        Errors that are not about the row itself, such as a lost connection or
+        a missing table, propagate and leave the batch queued.
+        """
+        query = "INSERT INTO {} ({}) VALUES ({})".format(
+            table, ", ".join(columns), ", ".join(f"${n}" for n in range(1, len(columns) + 1))
+        )
+        written = 0
+        async with self.pool.acquire() as conn:
+            for row in batch:
+                try:
+                    await conn.execute(query, *row)
+                except (asyncpg.DataError, asyncpg.IntegrityConstraintViolationError) as e:
+                    self.rejected += 1
+                    log.error("Dropping row rejected by %s: %s (%r)", table, e, row)
+                else:
+                    written += 1
+        return written
+
+    async def fetch_turns(self, guild_id, before_id=None, limit=50):
+        """Newest-first page of a guild's turns; pass the last row's id as `before_id` for the next page"""
+        async with self.pool.acquire() as conn:
+            return await conn.fetch(
+                "SELECT id, utterance_id, role, user_id, user_name, content, created_at "
+                "FROM conversation_turn "
+                "WHERE guild_id = $1 AND ($2::bigint IS NULL OR id < $2) "
+                "ORDER BY id DESC LIMIT $3",
+                str(guild_id), before_id, limit,
+            )
+
@@ -0,0 +1,469 @@
+"""Multi-guild load generator for the voice pipeline.
+
+Drives BotCommands.join_voice / leave_voice and VoiceConnection.process_voice_packet
+through a local fake gateway: fake guilds, channels and voice clients, with one
+reader thread per guild delivering 20 ms PCM frames the way discord-ext-voice-recv
+does. OpenAI and FFmpeg are replaced by fakes with configurable latency, so the
+numbers reflect the bot process itself.
+
+Usage:
+    python loadtest.py --guilds 50 --speakers 3 --ramp 10 --duration 30 --json results.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import resource
+import struct
+import threading
+import time
+import types
+from collections import defaultdict, deque
+
+import discord
+import openai
+
+from bot_commands import BotCommands
+from bot_logging import setup_logging
+from loop_watchdog import LoopWatchdog
+
+FRAME_MS = 20
+SAMPLE_RATE = 48000
+CHANNELS = 2
+FRAME_SAMPLES = SAMPLE_RATE * FRAME_MS // 1000
+TALK_FRAMES = 100   # each speaker talks for 2 seconds...
+PAUSE_FRAMES = 50   # ...then stays silent for 1 second:
+TRAILING_SILENCE_FRAMES = 5  # Discord sends 5 silence packets (decoded to zeros), then nothing
+SILENCE_FRAME = bytes(SAMPLE_RATE * FRAME_MS // 1000 * CHANNELS * 2)
+
+
+# -----------------------------
+# Fake Discord objects
+# -----------------------------
+class FakeUser:
+    def __init__(self, user_id, name, bot=False):
+        self.id = user_id
+        self.display_name = name
+        self.name = name
+        self.bot = bot
+        self.voice = None
+
+
+class FakePermissions:
+    connect = True
+    speak = True
+
+
+class FakeVoiceData:
+    __slots__ = ("pcm",)
+
+    def __init__(self, pcm):
+        self.pcm = pcm
+
+
+class FakeAudioSource:
+    """Stands in for FFmpegPCMAudio so no ffmpeg process is spawned"""
+
+    def __init__(self, path, *args, **kwargs):
+        self.path = path
+
+    def cleanup(self):
+        pass
+
+
+def _fake_ogg_opus(seconds=2.0):
+    """A minimal Ogg Opus stream of 20 ms silence packets, shaped like OpenAI's `opus` TTS output"""
+    packets = [b"OpusHead" + bytes(11), b"OpusTags" + bytes(8)]
+    packets += [b"\xf8\xff\xfe"] * int(seconds * 1000 / FRAME_MS)
+
+    pages = []
+    for pagenum, start in enumerate(range(0, len(packets), 255)):
+        chunk = packets[start:start + 255]
+        header = struct.pack("<4sBBQIIIB", b"OggS", 0, 0, 0, 1, pagenum, 0, len(chunk))
+        pages.append(header + bytes(len(p) for p in chunk) + b"".join(chunk))
+    return b"".join(pages)
+
+
+class FakeVoiceClient:
+    def __init__(self, channel, playback_seconds):
+        self.channel = channel
+        self.guild = channel.guild
+        self.sink = None
+        self.connected = True
+        self.playing = False
+        self.playback_seconds = playback_seconds
+
+    def listen(self, sink):
+        self.sink = sink
+
+    def is_connected(self):
+        return self.connected
+
+    async def disconnect(self):
+        self.connected = False
+        self.channel.gateway.on_disconnect(self)
+
+    def is_playing(self):
+        return self.playing
+
+    def stop(self):
+        self.playing = False
+
+    def play(self, source, after=None):
+        self.playing = True
+
+        def finish():
+            self.playing = False
+            if after:
+                after(None)
+
+        timer = threading.Timer(self.playback_seconds, finish)
+        timer.daemon = True
+        timer.start()
+
+
+class FakeVoiceChannel:
+    def __init__(self, gateway, guild, name, members):
+        self.gateway = gateway
+        self.guild = guild
+        self.name = name
+        self.members = members
+
+    def permissions_for(self, member):
+        return FakePermissions()
+
+    async def connect(self, cls=None, **kwargs):
+        await asyncio.sleep(self.gateway.connect_latency)
+        voice_client = FakeVoiceClient(self, self.gateway.tts_latency)
+        self.gateway.on_connect(voice_client)
+        return voice_client
+
+
+class FakeGuild:
+    def __init__(self, guild_id, me):
+        self.id = guild_id
+        self.name = f"loadtest-{guild_id}"
+        self.me = me
+        self.text_channels = []
+
+
+class FakeResponse:
+    def __init__(self):
+        self.done = False
+
+    def is_done(self):
+        return self.done
+
+    async def defer(self, *args, **kwargs):
+        self.done = True
+
+    async def send_message(self, *args, **kwargs):
+        self.done = True
+
+
+class FakeFollowup:
+    async def send(self, *args, **kwargs):
+        pass
+
+
+class FakeInteraction:
+    def __init__(self, user, guild, client):
+        self.user = user
+        self.guild = guild
+        self.client = client
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+
+
+class FakeBot:
+    def __init__(self, loop):
+        self.loop = loop
+        self.user = FakeUser(0, "Dufu", bot=True)
+
+
+# -----------------------------
+# Fake OpenAI backends
+# -----------------------------
+def install_fake_backends(stt_latency, llm_latency, tts_latency):
+    """Replace OpenAI calls and FFmpeg with blocking fakes of the given latency"""
+
+    phrases = [
+        "hello there how are you doing today",
+        "what is the weather like where you are",
+        "can you tell me a short joke",
+        "what did you have for breakfast",
+    ]
+    counter = itertools.count()
+
+    def transcribe(**kwargs):
+        time.sleep(stt_latency)
+        # Rotate phrases so the duplicate-transcript filter does not drop every turn
+        n = next(counter)
+        text = f"{phrases[n % len(phrases)]} number {n}"
+        segment = types.SimpleNamespace(no_speech_prob=0.01, avg_logprob=-0.2)
+        return types.SimpleNamespace(text=text, segments=[segment])
+
+    def complete(**kwargs):
+        time.sleep(llm_latency)
+        message = types.SimpleNamespace(content="I'm doing great, thanks for asking!")
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+    opus_audio = _fake_ogg_opus()
+
+    def speak(**kwargs):
+        time.sleep(tts_latency)
+        content = opus_audio if kwargs.get("response_format") == "opus" else b"\x00" * 16000
+        return types.SimpleNamespace(content=content)
+
+    openai.audio.transcriptions.create = transcribe
+    openai.chat.completions.create = complete
+    openai.audio.speech.create = speak
+    discord.FFmpegPCMAudio = FakeAudioSource
+    discord.FFmpegOpusAudio = FakeAudioSource
+
+
+def _speech_frame(frequency, amplitude=8000):
+    """One 20 ms stereo 16-bit frame of a sine tone"""
+    samples = []
+    for i in range(FRAME_SAMPLES):
+        value = int(amplitude * math.sin(2 * math.pi * frequency * i / SAMPLE_RATE))
+        samples.extend((value, value))
+    return struct.pack(f"<{len(samples)}h", *samples)
+
+
+def _speech_frames(frequency, quiet=False):
+    """A syllable-like pattern: three loud frames then one at the background level"""
+    loud = _speech_frame(frequency, amplitude=1200 if quiet else 8000)
+    return [loud, loud, loud, _speech_frame(frequency, amplitude=100 if quiet else 150)]
+
+
+# -----------------------------
+# Gateway and metrics
+# -----------------------------
+class FakeGateway:
+    """Owns the fake guilds and the per-guild packet reader threads"""
+
+    def __init__(self, speakers, connect_latency, tts_latency):
+        self.speakers = speakers
+        self.connect_latency = connect_latency
+        self.tts_latency = tts_latency
+        self.readers = {}  # guild_id: (thread, stop event)
+        self.packets_sent = 0
+        self.packets_dropped = 0
+        self.packet_errors = 0
+        self._lock = threading.Lock()
+
+    def make_guild(self, guild_id, bot):
+        guild = FakeGuild(guild_id, bot.user)
+        members = [
+            FakeUser(guild_id * 1000 + n, f"speaker-{guild_id}-{n}")
+            for n in range(1, self.speakers + 1)
+        ]
+        channel = FakeVoiceChannel(self, guild, f"voice-{guild_id}", members)
+        for member in members:
+            member.voice = types.SimpleNamespace(channel=channel)
+        return guild, members
+
+    def on_connect(self, voice_client):
+        stop = threading.Event()
+        thread = threading.Thread(target=self._reader, args=(voice_client, stop), daemon=True)
+        self.readers[voice_client.guild.id] = (thread, stop)
+        thread.start()
+
+    def on_disconnect(self, voice_client):
+        reader = self.readers.pop(voice_client.guild.id, None)
+        if reader:
+            reader[1].set()
+
+    def stop_all(self):
+        for _, stop in self.readers.values():
+            stop.set()
+
+    def _reader(self, voice_client, stop):
+        """Deliver one frame per speaker every 20 ms; late ticks count as dropped frames"""
+        # Alternate normal and quiet speakers
+        frames = [_speech_frames(220 + 40 * n, quiet=n % 2 == 1) for n in range(len(voice_client.channel.members))]
+        tick = 0
+        next_deadline = time.perf_counter()
+
+        while not stop.is_set():
+            sink = voice_client.sink
+            if sink is not None:
+                for n, member in enumerate(voice_client.channel.members):
+                    # Stagger speakers so they do not all talk at once
+                    phase = (tick + n * 37) % (TALK_FRAMES + PAUSE_FRAMES)
+                    if phase < TALK_FRAMES:
+                        pcm = frames[n][phase % len(frames[n])]
+                    elif phase < TALK_FRAMES + TRAILING_SILENCE_FRAMES:
+                        pcm = SILENCE_FRAME
+                    else:
+                        continue
+                    try:
+                        sink.write(member, FakeVoiceData(pcm))
+                        with self._lock:
+                            self.packets_sent += 1
+                    except Exception:
+                        with self._lock:
+                            self.packet_errors += 1
+
+            tick += 1
+            next_deadline += FRAME_MS / 1000
+            delay = next_deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Fell behind: frames for the missed ticks are lost, as with a real jitter buffer
+                missed = int(-delay * 1000 // FRAME_MS)
+                if missed:
+                    with self._lock:
+                        self.packets_dropped += missed * len(voice_client.channel.members)
+                    tick += missed
+                    next_deadline += missed * FRAME_MS / 1000
+
+
+def _rss_mb():
+    """Current resident set size in MB (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+# -----------------------------
+# Runner
+# -----------------------------
+async def run(args):
+    loop = asyncio.get_running_loop()
+    bot = FakeBot(loop)
+    gateway = FakeGateway(args.speakers, args.connect_latency, args.tts_latency)
+    commands = BotCommands({}, defaultdict(lambda: deque(maxlen=50)), {"nova": "Nova"}, "nova")
+    # Measures loop lag for the samples below and logs stack samples of anything blocking the loop
+    watchdog = LoopWatchdog(interval=0.05)
+    watchdog.start()
+    seen_beats = 0
+
+    guilds = []
+    joins = set()
+    samples = []
+    started = time.perf_counter()
+    ramp_interval = args.ramp / args.guilds if args.guilds else 0
+
+    async def join(guild_id):
+        guild, members = gateway.make_guild(guild_id, bot)
+        await commands.join_voice(FakeInteraction(members[0], guild, bot), bot)
+        guilds.append((guild, members))
+
+    async def sample():
+        nonlocal seen_beats
+        new_beats = min(watchdog.beats - seen_beats, len(watchdog.lag_samples))
+        seen_beats = watchdog.beats
+        lag = [seconds * 1000 for seconds in list(watchdog.lag_samples)[len(watchdog.lag_samples) - new_beats:]]
+        with gateway._lock:
+            sent, dropped, errors = gateway.packets_sent, gateway.packets_dropped, gateway.packet_errors
+        point = {
+            "t": round(time.perf_counter() - started, 1),
+            "guilds": len(commands.active_connections),
+            "loop_lag_p50_ms": round(_percentile(lag, 50), 2),
+            "loop_lag_p99_ms": round(_percentile(lag, 99), 2),
+            "loop_lag_max_ms": round(max(lag, default=0.0), 2),
+            "tasks": len(asyncio.all_tasks()),
+            "threads": threading.active_count(),
+            "rss_mb": round(_rss_mb(), 1),
+            "packets_sent": sent,
+            "packets_dropped": dropped,
+            "packet_errors": errors,
+        }
+        samples.append(point)
+        print(
+            f"t={point['t']:>6}s guilds={point['guilds']:>4} "
+            f"lag p50/p99/max={point['loop_lag_p50_ms']}/{point['loop_lag_p99_ms']}/{point['loop_lag_max_ms']}ms "
+            f"tasks={point['tasks']:>5} threads={point['threads']:>4} rss={point['rss_mb']}MB "
+            f"sent={sent} dropped={dropped} errors={errors}"
+        )
+
+    next_sample = time.perf_counter() + 1
+    for guild_id in range(1, args.guilds + 1):
+        task = asyncio.create_task(join(guild_id))
+        joins.add(task)
+        task.add_done_callback(joins.discard)
+        await asyncio.sleep(ramp_interval)
+        if time.perf_counter() >= next_sample:
+            await sample()
+            next_sample += 1
+
+    hold_until = time.perf_counter() + args.duration
+    while time.perf_counter() < hold_until:
+        await asyncio.sleep(max(0.0, next_sample - time.perf_counter()))
+        await sample()
+        next_sample += 1
+
+    gates = [stt.noise_gate.stats() for connection in commands.active_connections.values()
+             for stt in connection.stt_connections.values()]
+    for guild, members in guilds:
+        await commands.leave_voice(FakeInteraction(members[0], guild, bot))
+    gateway.stop_all()
+    watchdog.stop()
+
+    steady = [s for s in samples if s["guilds"] == args.guilds] or samples
+    summary = {
+        "guilds": args.guilds,
+        "speakers_per_guild": args.speakers,
+        "duration_s": args.duration,
+        "loop_lag_p99_ms": max((s["loop_lag_p99_ms"] for s in steady), default=0.0),
+        "loop_lag_max_ms": max((s["loop_lag_max_ms"] for s in samples), default=0.0),
+        "peak_tasks": max((s["tasks"] for s in samples), default=0),
+        "peak_rss_mb": max((s["rss_mb"] for s in samples), default=0.0),
+        "packets_sent": gateway.packets_sent,
+        "packets_dropped": gateway.packets_dropped,
+        "packet_errors": gateway.packet_errors,
+        "loop_stalls": watchdog.stalls,
+        "utterances_accepted": sum(g["accepted"] for g in gates),
+        "utterances_rejected_noise": sum(g["rejected_noise"] for g in gates),
+        "samples": samples,
+    }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the voice pipeline against a fake Discord gateway")
+    parser.add_argument("--guilds", type=int, default=10, help="number of simultaneous guilds to ramp to")
+    parser.add_argument("--speakers", type=int, default=2, help="speakers per guild")
+    parser.add_argument("--ramp", type=float, default=5.0, help="seconds to ramp up to --guilds")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds to hold at full load")
+    parser.add_argument("--connect-latency", type=float, default=0.2, help="fake voice connect latency (s)")
+    parser.add_argument("--stt-latency", type=float, default=0.6, help="fake Whisper latency (s)")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="fake GPT latency (s)")
+    parser.add_argument("--tts-latency", type=float, default=0.5, help="fake TTS latency and playback time (s)")
+    parser.add_argument("--json", help="write the summary and per-second samples to this file")
+    args = parser.parse_args()
+
+    setup_logging()
+    install_fake_backends(args.stt_latency, args.llm_latency, args.tts_latency)
+    summary = asyncio.run(run(args))
+
+    print(
+        f"\n{summary['guilds']} guilds x {summary['speakers_per_guild']} speakers: "
+        f"loop lag p99={summary['loop_lag_p99_ms']}ms max={summary['loop_lag_max_ms']}ms, "
+        f"peak tasks={summary['peak_tasks']}, peak RSS={summary['peak_rss_mb']}MB, "
+        f"dropped {summary['packets_dropped']}/{summary['packets_sent'] + summary['packets_dropped']} packets "
+        f"(late fake reader ticks), noise gate accepted {summary['utterances_accepted']} / "
+        f"rejected {summary['utterances_rejected_noise']} utterances"
+    )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
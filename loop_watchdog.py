@@ -0,0 +1,107 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from bot_logging import get_logger
+
+log = get_logger(__name__)
+
+DEFAULT_INTERVAL = 0.1      # seconds between heartbeats on the loop
+DEFAULT_THRESHOLD = 0.25    # seconds of blocking before a stack sample is logged
+STACK_SAMPLE_EVERY = 1.0    # seconds between repeated samples during one long stall
+
+
+class LoopWatchdog:
+    """Measures event loop lag and logs where the loop is stuck when it blocks.
+
+    A heartbeat task on the loop records how late each sleep wakes up. A
+    separate daemon thread checks the last heartbeat; if the loop has not
+    ticked for longer than `threshold`, it captures the loop thread's current
+    stack, which points at the callback that is blocking.
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL, threshold=DEFAULT_THRESHOLD, window=600):
+        self.interval = interval
+        self.threshold = threshold
+        self.lag_samples = deque(maxlen=window)  # recent lag values in seconds
+        self.beats = 0  # heartbeats so far, to tell which lag_samples are new
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.loop = None
+        self._loop_thread_id = None
+        self._last_beat = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """Start monitoring the running loop. Must be called from the loop; safe to call again."""
+        if self._task is not None and not self._task.done():
+            return
+
+        self.loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = self.loop.create_task(self._heartbeat())
+
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _heartbeat(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - start - self.interval)
+            self._last_beat = now
+            self.lag_samples.append(lag)
+            self.beats += 1
+            self.max_lag = max(self.max_lag, lag)
+
+    def _watch(self):
+        stalled_since = None
+        last_sample = 0.0
+
+        while not self._stop.wait(self.threshold / 2):
+            if self.loop is None or not self.loop.is_running():
+                continue
+
+            blocked_for = time.monotonic() - self._last_beat - self.interval
+            if blocked_for < self.threshold:
+                stalled_since = None
+                continue
+
+            now = time.monotonic()
+            if stalled_since is None:
+                stalled_since = now
+                self.stalls += 1
+            elif now - last_sample < STACK_SAMPLE_EVERY:
+                continue
+
+            last_sample = now
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "<loop thread not found>"
+            log.warning("Event loop blocked for %.0f ms, loop thread stack:\n%s", blocked_for * 1000, stack)
+
+    def metrics(self):
+        """Current loop health for /status"""
+        samples = sorted(self.lag_samples)
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] if samples else 0.0
+        pending = len(asyncio.all_tasks(self.loop)) if self.loop else 0
+        return {
+            "lag_ms": (self.lag_samples[-1] if self.lag_samples else 0.0) * 1000,
+            "lag_p99_ms": p99 * 1000,
+            "lag_max_ms": self.max_lag * 1000,
+            "pending_tasks": pending,
+            "stalls": self.stalls,
+        }
@@ -0,0 +1,233 @@
+import os
+import threading
+import time
+
+from bot_logging import get_logger
+
+log = get_logger(__name__)
+
+# Environment configuration (model lists are ordered cheapest/fastest first):
+#   CHAT_MODELS          e.g. "gpt-4o-mini,gpt-3.5-turbo,gpt-4o"
+#   TTS_MODELS           e.g. "tts-1,tts-1-hd"
+#   STT_MODELS           e.g. "whisper-1"
+#   GUILD_TIERS          per-guild tier overrides, e.g. "1234=premium,5678=free"
+#   DEFAULT_GUILD_TIER   tier for every other guild (standard)
+#   CHAT_LATENCY_BUDGET_MS / TTS_LATENCY_BUDGET_MS / STT_LATENCY_BUDGET_MS
+#                        step down a tier while a model's recent latency is above this
+#   MAX_REPLY_SECONDS    cap replies to what can be spoken in this many seconds
+DEFAULT_MODELS = {
+    "chat": "gpt-3.5-turbo",
+    "tts": "tts-1",
+    "stt": "whisper-1",
+}
+DEFAULT_LATENCY_BUDGET_MS = {
+    "chat": 2500.0,
+    "tts": 1500.0,
+    "stt": 2000.0,
+}
+TIERS = ("free", "standard", "premium")
+SHORT_UTTERANCE_WORDS = 4     # "hi", "what's up" do not need the best model
+THROTTLE_COOLDOWN_S = 30.0    # skip a model for this long after a rate limit
+LATENCY_ALPHA = 0.2           # smoothing for per-model latency
+LATENCY_STALE_S = 120.0       # forget a model's latency once it has not been used for this long
+
+# Speaking rate used to turn a time budget into output tokens
+WORDS_PER_SECOND = 2.5
+TOKENS_PER_WORD = 1.33
+DEFAULT_MAX_REPLY_SECONDS = 20
+MIN_MAX_TOKENS = 30
+MAX_MAX_TOKENS = 100          # the previous fixed limit
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def _parse_list(value, default):
+    models = [m.strip() for m in (value or "").split(",") if m.strip()]
+    return models or [default]
+
+
+def _parse_tiers(spec):
+    tiers = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        guild_id, tier = item.split("=", 1)
+        tiers[guild_id.strip()] = tier.strip().lower()
+    return tiers
+
+
+class Route:
+    """The model chosen for one request, and why"""
+
+    __slots__ = ("kind", "model", "tier", "reason", "max_tokens")
+
+    def __init__(self, kind, model, tier, reason, max_tokens=None):
+        self.kind = kind
+        self.model = model
+        self.tier = tier
+        self.reason = reason
+        self.max_tokens = max_tokens
+
+    def __repr__(self):
+        return f"Route({self.kind}={self.model}, tier={self.tier}, reason={self.reason})"
+
+
+class ModelRouter:
+    """Picks chat, TTS and STT models per request.
+
+    The guild tier selects a starting model from the ordered list; short
+    utterances, a model running over its latency budget, or a recent rate
+    limit move the request to a cheaper/faster model.
+    """
+
+    def __init__(self, models, latency_budget_ms, guild_tiers=None, default_tier="standard",
+                 max_reply_seconds=DEFAULT_MAX_REPLY_SECONDS):
+        self.models = models  # kind: [model, ...] cheapest first
+        self.latency_budget_ms = latency_budget_ms
+        self.guild_tiers = guild_tiers or {}
+        self.default_tier = default_tier
+        self.max_reply_seconds = max_reply_seconds
+        self.latency_ms = {}  # model: smoothed latency
+        self.latency_updated = {}  # model: monotonic time of the last sample
+        self.throttled_until = {}  # model: monotonic time
+        self.route_counts = {}  # (kind, model): requests routed
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            models={kind: _parse_list(os.getenv(f"{kind.upper()}_MODELS"), default)
+                    for kind, default in DEFAULT_MODELS.items()},
+            latency_budget_ms={kind: float(os.getenv(f"{kind.upper()}_LATENCY_BUDGET_MS", budget))
+                               for kind, budget in DEFAULT_LATENCY_BUDGET_MS.items()},
+            guild_tiers=_parse_tiers(os.getenv("GUILD_TIERS")),
+            default_tier=os.getenv("DEFAULT_GUILD_TIER", "standard").lower(),
+            max_reply_seconds=float(os.getenv("MAX_REPLY_SECONDS", DEFAULT_MAX_REPLY_SECONDS)),
+        )
+
+    def tier_for(self, guild_id):
+        tier = self.guild_tiers.get(str(guild_id), self.default_tier)
+        return tier if tier in TIERS else self.default_tier
+
+    def _select(self, kind, guild_id, step_down=False):
+        models = self.models[kind]
+        tier = self.tier_for(guild_id)
+        # free -> cheapest, premium -> best, standard -> the middle of the list
+        index = {"free": 0, "standard": (len(models) - 1) // 2, "premium": len(models) - 1}[tier]
+        reason = f"tier:{tier}"
+
+        if step_down and index > 0:
+            index -= 1
+            reason = "short_utterance"
+
+        # A slow model is skipped until its measurement goes stale, then it is tried again
+        now = time.monotonic()
+        budget = self.latency_budget_ms[kind]
+        fresh = now - self.latency_updated.get(models[index], 0.0) < LATENCY_STALE_S
+        if index > 0 and fresh and self.latency_ms.get(models[index], 0.0) > budget:
+            index -= 1
+            reason = "latency"
+
+        if self.throttled_until.get(models[index], 0.0) > now:
+            # Prefer cheaper models, then better ones, that are not rate limited
+            candidates = list(range(index - 1, -1, -1)) + list(range(index + 1, len(models)))
+            available = [i for i in candidates if self.throttled_until.get(models[i], 0.0) <= now]
+            if available:
+                index = available[0]
+                reason = "throttled"
+
+        return Route(kind, models[index], tier, reason)
+
+    def _count(self, route):
+        with self._lock:
+            key = (route.kind, route.model)
+            self.route_counts[key] = self.route_counts.get(key, 0) + 1
+        return route
+
+    def _route(self, kind, guild_id, step_down=False):
+        return self._count(self._select(kind, guild_id, step_down))
+
+    def _select_chat(self, guild_id, text):
+        route = self._select("chat", guild_id, step_down=len(text.split()) < SHORT_UTTERANCE_WORDS)
+        route.max_tokens = self.max_tokens_for(route.tier)
+        return route
+
+    def route_chat(self, guild_id, text):
+        return self._count(self._select_chat(guild_id, text))
+
+    def reroute_chat(self, throttled, guild_id, text):
+        """Route for retrying after `throttled` hit a rate limit, or None if the
+        router would pick the same model again (e.g. only one chat model is configured)"""
+        route = self._select_chat(guild_id, text)
+        if route.model == throttled.model:
+            return None
+        return self._count(route)
+
+    def route_tts(self, guild_id):
+        return self._route("tts", guild_id)
+
+    def route_stt(self, guild_id):
+        return self._route("stt", guild_id)
+
+    def max_tokens_for(self, tier):
+        """Output tokens that can be spoken within the reply time budget"""
+        seconds = self.max_reply_seconds * (1.5 if tier == "premium" else 1.0)
+        tokens = int(seconds * WORDS_PER_SECOND * TOKENS_PER_WORD)
+        return max(MIN_MAX_TOKENS, min(tokens, MAX_MAX_TOKENS))
+
+    def record(self, route, latency_ms, logger=None):
+        """Update the model's smoothed latency and log the route with its measured latency"""
+        with self._lock:
+            previous = self.latency_ms.get(route.model)
+            stale = time.monotonic() - self.latency_updated.get(route.model, 0.0) >= LATENCY_STALE_S
+            self.latency_ms[route.model] = (
+                latency_ms if previous is None or stale else previous + LATENCY_ALPHA * (latency_ms - previous)
+            )
+            self.latency_updated[route.model] = time.monotonic()
+        (logger or log).info("Route %s=%s (%s, %s) took %.0f ms",
+                             route.kind, route.model, route.tier, route.reason, latency_ms)
+
+    def record_throttle(self, route, retry_after=None):
+        """Skip this model until the cooldown (or the server's retry-after) has passed"""
+        cooldown = retry_after or THROTTLE_COOLDOWN_S
+        with self._lock:
+            self.throttled_until[route.model] = time.monotonic() + cooldown
+        log.warning("Model %s rate limited, routing around it for %.0f s", route.model, cooldown)
+
+    def stats(self):
+        return {
+            "latency_ms": dict(self.latency_ms),
+            "throttled": [m for m, until in self.throttled_until.items() if until > time.monotonic()],
+            "routes": {f"{kind}:{model}": n for (kind, model), n in self.route_counts.items()},
+        }
+
+
+def get_router():
+    """Process-wide router shared by all guilds (latency and throttling are per model)"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter.from_env()
+        return _router
+
+
+def timed_call(fn, **kwargs):
+    """Call `fn` and return (result, milliseconds).
+
+    Run this inside asyncio.to_thread so the time spent queued for an
+    executor thread is not counted as model latency.
+    """
+    started = time.perf_counter()
+    result = fn(**kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def retry_after_seconds(error):
+    """Retry-After from an OpenAI rate limit error, if the server sent one"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,103 @@
+import audioop
+import math
+from collections import deque
+
+SNR_THRESHOLD_DB = 10.0   # utterance must be this far above the speaker's noise floor
+MIN_VOICED_RATIO = 0.2    # fraction of frames that must rise above the floor
+VOICED_MARGIN = 2.0       # frame counts as voiced when rms > floor * margin (~6 dB)
+MIN_NOISE_FLOOR = 30.0    # keeps SNR finite for digitally silent mics
+FLOOR_WINDOW_FRAMES = 250  # floor is the quietest frame among the last ~5 s of packets
+ALPHA_SPEECH = 0.05       # smoothing for the speaker's voiced level
+TARGET_SPEECH_RMS = 3000.0
+MAX_GAIN = 4.0
+
+
+class NoiseGate:
+    """Per-speaker noise floor tracking and SNR gate.
+
+    `observe_frame` runs on the voice reader thread for every 20 ms packet
+    and does amortized O(1) work on top of one RMS. The floor is the minimum
+    frame RMS over the last FLOOR_WINDOW_FRAMES packets. Speech always has
+    quieter gaps between syllables that reveal the background level, while
+    steady input such as mains hum or a fan sets the floor to its own level
+    and so never clears the SNR gate. Only frames well above the floor count
+    as voiced and feed the speech level used for gain.
+    """
+
+    def __init__(self):
+        self.noise_floor = None
+        self.speech_level = None
+        self._window = deque()  # (frame index, rms) with increasing rms, for the sliding minimum
+        self._frame_index = 0
+        self.frames = 0
+        self.voiced_frames = 0
+        self.accepted = 0
+        self.rejected_short = 0
+        self.rejected_noise = 0
+
+    def observe_frame(self, pcm_frame, sample_width=2):
+        try:
+            rms = audioop.rms(pcm_frame, sample_width)
+        except audioop.error:
+            return
+
+        if rms == 0:
+            # Discord's trailing silence packets decode to all-zero PCM; they say nothing about the mic
+            return
+
+        index = self._frame_index
+        self._frame_index += 1
+        window = self._window
+        while window and window[-1][1] >= rms:
+            window.pop()
+        window.append((index, rms))
+        if window[0][0] <= index - FLOOR_WINDOW_FRAMES:
+            window.popleft()
+        self.noise_floor = max(float(window[0][1]), MIN_NOISE_FLOOR)
+
+        self.frames += 1
+        if rms > self.noise_floor * VOICED_MARGIN:
+            self.voiced_frames += 1
+            if self.speech_level is None:
+                self.speech_level = float(rms)
+            self.speech_level += ALPHA_SPEECH * (rms - self.speech_level)
+
+    def snr_db(self, rms):
+        floor = self.noise_floor or MIN_NOISE_FLOOR
+        return 20 * math.log10(max(rms, 1) / floor)
+
+    def take_utterance(self):
+        """Return (frames, voiced_frames) seen since the last call and reset them"""
+        counts = (self.frames, self.voiced_frames)
+        self.frames = 0
+        self.voiced_frames = 0
+        return counts
+
+    def accept(self, rms, frames, voiced_frames):
+        """Decide whether an utterance is worth transcribing; updates the counters"""
+        voiced_ratio = voiced_frames / frames if frames else 0.0
+        if self.snr_db(rms) < SNR_THRESHOLD_DB or voiced_ratio < MIN_VOICED_RATIO:
+            self.rejected_noise += 1
+            return False
+        self.accepted += 1
+        return True
+
+    def reject_short(self):
+        self.rejected_short += 1
+
+    def apply_gain(self, pcm_data, sample_width=2):
+        """Boost quiet speakers toward a common level before transcription"""
+        if not self.speech_level:
+            return pcm_data
+        gain = min(TARGET_SPEECH_RMS / self.speech_level, MAX_GAIN)
+        if gain <= 1.2:
+            return pcm_data
+        return audioop.mul(pcm_data, sample_width, gain)
+
+    def stats(self):
+        return {
+            "accepted": self.accepted,
+            "rejected_short": self.rejected_short,
+            "rejected_noise": self.rejected_noise,
+            "noise_floor": self.noise_floor or 0.0,
+        }
@@ -0,0 +1,125 @@
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import discord
+from discord.oggparse import OggStream
+
+# Environment configuration:
+#   TTS_PLAYBACK       "opus" (default) requests Opus from OpenAI and plays it as-is,
+#                      "pcm" uses the original MP3 -> FFmpegPCMAudio path
+#   TTS_CACHE_MB       size of the encoded-frame cache shared by all guilds (0 disables it)
+DEFAULT_CACHE_MB = 16
+FRAME_MS = 20  # discord.py sends one packet per 20 ms tick
+
+# Opus frame sizes by TOC config (RFC 6716, section 3.1)
+_SILK_MS = (10, 20, 40, 60)
+_HYBRID_MS = (10, 20)
+_CELT_MS = (2.5, 5, 10, 20)
+
+
+def opus_playback_enabled():
+    return os.getenv("TTS_PLAYBACK", "opus").lower() == "opus"
+
+
+def packet_duration_ms(packet):
+    """Duration of one Opus packet from its TOC byte"""
+    toc = packet[0]
+    config = toc >> 3
+    if config < 12:
+        frame_ms = _SILK_MS[config % 4]
+    elif config < 16:
+        frame_ms = _HYBRID_MS[config % 2]
+    else:
+        frame_ms = _CELT_MS[config % 4]
+
+    code = toc & 0x03
+    if code == 0:
+        frames = 1
+    elif code in (1, 2):
+        frames = 2
+    else:
+        frames = packet[1] & 0x3F if len(packet) > 1 else 0
+    return frame_ms * frames
+
+
+def demux_ogg_opus(data):
+    """Split an Ogg Opus file into raw Opus packets, dropping the OpusHead/OpusTags headers"""
+    return [
+        packet for packet in OggStream(io.BytesIO(data)).iter_packets()
+        if packet and not packet.startswith((b"OpusHead", b"OpusTags"))
+    ]
+
+
+def packets_fit_discord(packets):
+    """True if every packet is exactly one 20 ms tick, so it can be sent without re-encoding"""
+    return bool(packets) and all(packet_duration_ms(p) == FRAME_MS for p in packets)
+
+
+class OpusPacketSource(discord.AudioSource):
+    """Plays pre-encoded 20 ms Opus packets; discord.py sends them without decoding or encoding"""
+
+    def __init__(self, packets):
+        self.packets = packets
+        self._index = 0
+
+    def read(self):
+        if self._index >= len(self.packets):
+            return b""
+        packet = self.packets[self._index]
+        self._index += 1
+        return packet
+
+    def is_opus(self):
+        return True
+
+
+class OpusFrameCache:
+    """LRU cache of encoded packets keyed by (voice, model, text), bounded by total bytes"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            packets = self._entries.get(key)
+            if packets is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return packets
+
+    def put(self, key, packets):
+        entry_size = sum(len(p) for p in packets)
+        if entry_size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = packets
+            self.size += entry_size
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= sum(len(p) for p in evicted)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_frame_cache():
+    """Process-wide frame cache, or None when TTS_CACHE_MB=0"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            max_mb = float(os.getenv("TTS_CACHE_MB", DEFAULT_CACHE_MB))
+            _cache = OpusFrameCache(int(max_mb * 1024 * 1024)) if max_mb > 0 else False
+        return _cache or None
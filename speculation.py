@@ -0,0 +1,82 @@
+import os
+import re
+import threading
+import time
+from collections import deque
+
+# Environment configuration:
+#   SPECULATIVE_STT                  "1" to transcribe partial windows and draft replies early
+#   SPECULATIVE_MAX_CALLS_PER_MIN    cap on extra Whisper + GPT calls made speculatively
+DEFAULT_MAX_CALLS_PER_MIN = 30
+
+_budget = None
+_budget_lock = threading.Lock()
+
+
+def speculation_enabled():
+    """Whether speculative transcription is switched on (read lazily, after load_dotenv)"""
+    return os.getenv("SPECULATIVE_STT", "").lower() in ("1", "true", "yes", "on")
+
+
+def normalize_transcript(text):
+    """Normalize a transcript for comparison: lowercase, no punctuation, single spaces"""
+    text = re.sub(r"[^\w\s']", " ", text.lower())
+    return " ".join(text.split())
+
+
+class SpeculationBudget:
+    """Sliding one-minute window capping the extra API calls spent on speculation"""
+
+    def __init__(self, max_calls_per_minute):
+        self.max_calls_per_minute = max_calls_per_minute
+        self.calls = deque()
+        self.spent = 0   # total speculative calls allowed
+        self.denied = 0  # total speculative calls refused by the cap
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        """Reserve one speculative call; returns False when the cap is reached"""
+        now = time.monotonic()
+        with self._lock:
+            while self.calls and now - self.calls[0] >= 60:
+                self.calls.popleft()
+
+            if len(self.calls) >= self.max_calls_per_minute:
+                self.denied += 1
+                return False
+
+            self.calls.append(now)
+            self.spent += 1
+            return True
+
+
+def get_budget():
+    """Process-wide speculation budget shared by all guilds"""
+    global _budget
+    with _budget_lock:
+        if _budget is None:
+            _budget = SpeculationBudget(
+                int(os.getenv("SPECULATIVE_MAX_CALLS_PER_MIN", DEFAULT_MAX_CALLS_PER_MIN))
+            )
+        return _budget
+
+
+class DraftReply:
+    """An LLM request started from a stable partial transcript"""
+
+    def __init__(self, key, task, routes=None):
+        self.key = key  # normalized partial transcript the draft was built from
+        self.task = task
+        self.routes = routes if routes is not None else {}  # kind: Route filled in by the request
+
+    def matches(self, text):
+        return self.key == normalize_transcript(text)
+
+    async def result(self):
+        """Draft response, or None if it failed or was cancelled"""
+        if self.task.cancelled():
+            return None
+        return await self.task
+
+    def cancel(self):
+        self.task.cancel()
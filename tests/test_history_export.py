@@ -0,0 +1,152 @@
+"""HistoryExporter against a real Postgres.
+
+Skipped unless DATABASE_URL is set. Each test applies the web app's
+conversation history migrations to a throwaway schema and drops it
+afterwards, so any local database can be used:
+
+    DATABASE_URL=postgres://localhost/dufu python -m pytest tests
+"""
+import asyncio
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+asyncpg = pytest.importorskip("asyncpg")
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from history import HistoryRecord  # noqa: E402
+from history_export import MAX_COPY_FAILURES, HistoryExporter  # noqa: E402
+
+DSN = os.getenv("DATABASE_URL")
+MIGRATIONS = [
+    ROOT / "web" / "db" / "migrations" / "0001_conversation_history.sql",
+    ROOT / "web" / "db" / "migrations" / "0002_latency_routes.sql",
+]
+
+pytestmark = pytest.mark.skipif(not DSN, reason="DATABASE_URL is not set")
+
+
+def run_with_exporter(test, batch_size=2):
+    """Run `test(exporter, conn)` with both pointed at a fresh, migrated schema"""
+
+    async def main():
+        schema = f"history_export_test_{uuid.uuid4().hex[:12]}"
+        conn = await asyncpg.connect(DSN)
+        try:
+            await conn.execute(f'CREATE SCHEMA "{schema}"')
+            await conn.execute(f'SET search_path TO "{schema}"')
+            for migration in MIGRATIONS:
+                for statement in migration.read_text().split("--> statement-breakpoint"):
+                    if statement.strip():
+                        await conn.execute(statement)
+
+            exporter = HistoryExporter(DSN, batch_size=batch_size)
+            exporter.pool = await asyncpg.create_pool(DSN, min_size=1, max_size=2,
+                                                      server_settings={"search_path": schema})
+            try:
+                await test(exporter, conn)
+            finally:
+                await exporter.close()
+        finally:
+            await conn.execute(f'DROP SCHEMA "{schema}" CASCADE')
+            await conn.close()
+
+    asyncio.run(main())
+
+
+def turn(text, user_id=1):
+    return HistoryRecord(HistoryRecord.USER, text, user_id=user_id, name="tester")
+
+
+def test_copy_writes_turns_and_latencies():
+    async def test(exporter, conn):
+        for n in range(5):
+            exporter.add_turn(42, turn(f"turn {n}"), utterance_id=n)
+        exporter.add_latency(42, 1, 0, stt_ms=500.0, llm_ms=800.0, tts_ms=None, draft_hit=True)
+        await exporter.flush()
+
+        assert exporter.exported == 6
+        assert exporter.turns == [] and exporter.latencies == []
+        rows = await conn.fetch("SELECT guild_id, utterance_id, role, user_id, content "
+                                "FROM conversation_turn ORDER BY id")
+        assert [tuple(row) for row in rows] == [("42", n, "user", "1", f"turn {n}") for n in range(5)]
+        latency = await conn.fetchrow("SELECT stt_ms, llm_ms, tts_ms, total_ms, draft_hit FROM utterance_latency")
+        assert tuple(latency) == (500.0, 800.0, None, 1300.0, True)
+
+    run_with_exporter(test)
+
+
+def test_failed_copy_is_retried_on_next_flush():
+    async def test(exporter, conn):
+        await conn.execute("ALTER TABLE conversation_turn RENAME TO conversation_turn_away")
+        exporter.add_turn(42, turn("survives an outage"))
+        with pytest.raises(asyncpg.UndefinedTableError):
+            await exporter.flush()
+        assert len(exporter.turns) == 1
+
+        await conn.execute("ALTER TABLE conversation_turn_away RENAME TO conversation_turn")
+        await exporter.flush()
+        assert exporter.turns == []
+        assert await conn.fetchval("SELECT content FROM conversation_turn") == "survives an outage"
+
+    run_with_exporter(test)
+
+
+def test_bad_row_is_dropped_after_repeated_copy_failures():
+    async def test(exporter, conn):
+        exporter.add_turn(42, turn("before"))
+        exporter.add_turn(42, turn("contains \x00 NUL"))
+        exporter.add_turn(42, turn("after"))
+
+        for _ in range(MAX_COPY_FAILURES - 1):
+            with pytest.raises(asyncpg.PostgresError):
+                await exporter.flush()
+            assert len(exporter.turns) == 3
+
+        await exporter.flush()
+        assert exporter.turns == []
+        assert exporter.rejected == 1
+        contents = await conn.fetch("SELECT content FROM conversation_turn ORDER BY id")
+        assert [row["content"] for row in contents] == ["before", "after"]
+
+    run_with_exporter(test, batch_size=10)
+
+
+def test_fetch_turns_pages_newest_first():
+    async def test(exporter, conn):
+        for n in range(5):
+            exporter.add_turn(42, turn(f"turn {n}"), utterance_id=n)
+        exporter.add_turn(7, turn("other guild"))
+        await exporter.flush()
+
+        pages = []
+        before_id = None
+        while True:
+            page = await exporter.fetch_turns(42, before_id=before_id, limit=2)
+            if not page:
+                break
+            pages.append([row["content"] for row in page])
+            before_id = page[-1]["id"]
+
+        assert pages == [["turn 4", "turn 3"], ["turn 2", "turn 1"], ["turn 0"]]
+
+    run_with_exporter(test)
+
+
+def test_overlapping_flushes_write_each_row_once():
+    async def test(exporter, conn):
+        for n in range(7):
+            exporter.add_turn(42, turn(f"turn {n}"))
+        await asyncio.gather(exporter.flush(), exporter.flush(), exporter.flush())
+
+        assert exporter.turns == []
+        assert exporter.exported == 7
+        contents = await conn.fetch("SELECT content FROM conversation_turn ORDER BY id")
+        assert [row["content"] for row in contents] == [f"turn {n}" for n in range(7)]
+
+    run_with_exporter(test)
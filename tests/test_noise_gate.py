@@ -0,0 +1,95 @@
+"""NoiseGate on synthetic 20 ms frames: steady hum must be learned as noise,
+quiet and normal speakers must still get through."""
+import audioop
+import math
+import random
+import struct
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from noise_gate import NoiseGate  # noqa: E402
+
+FRAME_SAMPLES = 960  # 20 ms at 48 kHz, per channel
+SILENCE = bytes(FRAME_SAMPLES * 4)  # what Discord's trailing 0xF8FFFE packets decode to
+
+
+def frame(rng, rms, frequency=120):
+    """One stereo 16-bit frame: a tone plus a little noise, with roughly the given RMS"""
+    amplitude = rms * math.sqrt(2)
+    phase = rng.random() * 2 * math.pi
+    samples = []
+    for i in range(FRAME_SAMPLES):
+        value = amplitude * math.sin(phase + 2 * math.pi * frequency * i / 48000)
+        value = int(value * (1 + rng.uniform(-0.05, 0.05)))
+        samples.extend((value, value))
+    return struct.pack(f"<{len(samples)}h", *samples)
+
+
+def hum(rng, level, frames=100):
+    return [frame(rng, level * rng.uniform(0.95, 1.05), frequency=60) for _ in range(frames)]
+
+
+def speech(rng, peak, gap, frames=100):
+    """Syllables of varying loudness separated by gaps at the background level"""
+    out = []
+    while len(out) < frames:
+        out += [frame(rng, peak * rng.uniform(0.4, 1.0), frequency=rng.uniform(150, 300))
+                for _ in range(rng.randint(4, 8))]
+        out += [frame(rng, gap * rng.uniform(0.8, 1.2)) for _ in range(rng.randint(2, 4))]
+    return out[:frames]
+
+
+def utterance(gate, frames):
+    """Feed one utterance followed by Discord's trailing silence packets; return accept()"""
+    for pcm in frames + [SILENCE] * 5:
+        gate.observe_frame(pcm)
+    counts = gate.take_utterance()
+    return gate.accept(audioop.rms(b"".join(frames), 2), *counts)
+
+
+@pytest.mark.parametrize("level", [502, 645, 1076, 3000])
+def test_steady_hum_is_rejected(level):
+    rng = random.Random(level)
+    gate = NoiseGate()
+    results = [utterance(gate, hum(rng, level)) for _ in range(5)]
+    assert results == [False] * 5
+    assert gate.noise_floor > level * 0.8
+
+
+@pytest.mark.parametrize("peak, gap", [(600, 40), (1500, 100), (6000, 150)])
+def test_speakers_are_accepted(peak, gap):
+    rng = random.Random(peak)
+    gate = NoiseGate()
+    assert [utterance(gate, speech(rng, peak, gap)) for _ in range(5)] == [True] * 5
+
+
+def test_speech_over_hum_is_accepted_and_hum_alone_is_not():
+    rng = random.Random(1)
+    gate = NoiseGate()
+    assert utterance(gate, hum(rng, 500)) is False
+    assert utterance(gate, speech(rng, 6000, 500)) is True
+    assert utterance(gate, hum(rng, 500)) is False
+
+
+def test_silence_packets_do_not_lower_the_floor():
+    rng = random.Random(2)
+    gate = NoiseGate()
+    for pcm in hum(rng, 800):
+        gate.observe_frame(pcm)
+    floor = gate.noise_floor
+    for _ in range(50):
+        gate.observe_frame(SILENCE)
+    assert gate.noise_floor == floor
+    assert gate.take_utterance()[0] == 100
+
+
+def test_hum_does_not_drive_speech_level():
+    rng = random.Random(3)
+    gate = NoiseGate()
+    for pcm in hum(rng, 1000, frames=300):
+        gate.observe_frame(pcm)
+    assert gate.speech_level is None
@@ -0,0 +1,25 @@
+"""Utterance ids are written to Postgres and must stay unique across bot restarts."""
+import itertools
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import STTConnection  # noqa: E402
+from STTConnection import _next_utterance_id  # noqa: E402
+
+
+def test_ids_are_unique_and_fit_a_js_number():
+    ids = [_next_utterance_id() for _ in range(4096)]
+    assert len(set(ids)) == len(ids)
+    assert 0 < min(ids) and max(ids) < 2 ** 53
+
+
+def test_restarted_process_does_not_reuse_ids(monkeypatch):
+    before = [_next_utterance_id() for _ in range(100)]
+    time.sleep(0.002)
+    # A new process starts its counter over, possibly at the same value
+    monkeypatch.setattr(STTConnection, "_utterance_counter", itertools.count(0))
+    after = [_next_utterance_id() for _ in range(100)]
+    assert min(after) > max(before)
@@ -0,0 +1,144 @@
+import math
+import time
+from collections import Counter
+
+from speculation import normalize_transcript
+
+NO_SPEECH_THRESHOLD = 0.6    # Whisper's own default for treating a segment as silence
+LOGPROB_THRESHOLD = -1.0     # ...combined with a low average log probability
+MIN_UNIQUE_WORD_RATIO = 0.3  # "the the the the the the" style repetition
+MIN_CHAR_ENTROPY = 2.0       # bits per character; "aaaaaaaa" or "........"
+DEDUP_WINDOW_S = 10.0        # identical transcripts from one speaker within this window are dropped
+
+# A stock phrase is only junk when Whisper is also unsure about it
+STOCK_PHRASE_NO_SPEECH_PROB = 0.3
+STOCK_PHRASE_LOGPROB = -0.8
+STOCK_PHRASE_MAX_CLIP_MS = 400
+
+# Subtitle credits and video outros Whisper emits for silence; never said to the bot (normalized)
+WHISPER_CREDITS = {
+    "",
+    "thank you for watching and please subscribe",
+    "thanks for watching and don't forget to subscribe",
+    "please subscribe",
+    "subscribe to my channel",
+    "like and subscribe",
+    "see you in the next video",
+    "subtitles by the amara org community",
+    "transcribed by https otter ai",
+}
+
+# Stock phrases Whisper produces for silence, noise or very short clips, but which are
+# also common real replies (normalized)
+KNOWN_HALLUCINATIONS = {
+    "you",
+    "thank you",
+    "thank you so much",
+    "thanks for watching",
+    "thank you for watching",
+    "see you next time",
+    "bye",
+    "bye bye",
+    "okay",
+    "oh",
+    "uh",
+    "um",
+    "hmm",
+    "music",
+    "applause",
+    "laughter",
+    "silence",
+}
+
+
+class Transcript:
+    """Whisper output with the confidence fields the filter needs"""
+
+    __slots__ = ("text", "no_speech_prob", "avg_logprob", "duration_ms", "stt_ms", "route")
+
+    def __init__(self, text, no_speech_prob=None, avg_logprob=None, duration_ms=None, stt_ms=None, route=None):
+        self.text = text
+        self.no_speech_prob = no_speech_prob
+        self.avg_logprob = avg_logprob
+        self.duration_ms = duration_ms  # length of the transcribed clip, filled in by STTConnection
+        self.stt_ms = stt_ms  # transcription round trip, filled in by STTConnection
+        self.route = route  # model_router.Route used for the transcription
+
+    @classmethod
+    def from_response(cls, response):
+        """Build from a verbose_json transcription (or a plain text one)"""
+        if isinstance(response, str):
+            return cls(response.strip())
+
+        segments = getattr(response, "segments", None) or []
+        no_speech = [s.no_speech_prob for s in segments if getattr(s, "no_speech_prob", None) is not None]
+        logprobs = [s.avg_logprob for s in segments if getattr(s, "avg_logprob", None) is not None]
+        return cls(
+            (response.text or "").strip(),
+            sum(no_speech) / len(no_speech) if no_speech else None,
+            sum(logprobs) / len(logprobs) if logprobs else None,
+        )
+
+
+def _low_confidence(no_speech_prob, avg_logprob, duration_ms):
+    return (
+        (no_speech_prob is not None and no_speech_prob >= STOCK_PHRASE_NO_SPEECH_PROB)
+        or (avg_logprob is not None and avg_logprob < STOCK_PHRASE_LOGPROB)
+        or (duration_ms is not None and duration_ms < STOCK_PHRASE_MAX_CLIP_MS)
+    )
+
+
+def _char_entropy(text):
+    counts = Counter(text)
+    total = len(text)
+    return -sum(n / total * math.log2(n / total) for n in counts.values())
+
+
+class TranscriptFilter:
+    """Drops junk transcripts before they cost a GPT and TTS call"""
+
+    def __init__(self, dedup_window=DEDUP_WINDOW_S):
+        self.dedup_window = dedup_window
+        self.recent = {}  # (user_id, normalized text): monotonic time last seen
+        self.passed = 0
+        self.rejected = Counter()  # reason: count
+
+    def junk_reason(self, text, no_speech_prob=None, avg_logprob=None, duration_ms=None):
+        """Content-only checks; returns a reason string or None"""
+        key = normalize_transcript(text)
+        if key in WHISPER_CREDITS:
+            return "hallucination"
+        if key in KNOWN_HALLUCINATIONS and _low_confidence(no_speech_prob, avg_logprob, duration_ms):
+            return "hallucination"
+
+        if no_speech_prob is not None and no_speech_prob >= NO_SPEECH_THRESHOLD:
+            if avg_logprob is None or avg_logprob < LOGPROB_THRESHOLD:
+                return "no_speech"
+
+        words = key.split()
+        if len(words) >= 6 and len(set(words)) / len(words) < MIN_UNIQUE_WORD_RATIO:
+            return "repetitive"
+
+        compact = text.replace(" ", "")
+        if len(compact) >= 10 and _char_entropy(compact) < MIN_CHAR_ENTROPY:
+            return "low_entropy"
+
+        return None
+
+    def check(self, text, no_speech_prob=None, avg_logprob=None, duration_ms=None, user_id=None):
+        """Full check for a final transcript, including per-speaker dedup; updates the counters"""
+        reason = self.junk_reason(text, no_speech_prob, avg_logprob, duration_ms)
+
+        if reason is None:
+            now = time.monotonic()
+            self.recent = {k: t for k, t in self.recent.items() if now - t < self.dedup_window}
+            key = (user_id, normalize_transcript(text))
+            if key in self.recent:
+                reason = "duplicate"
+            self.recent[key] = now
+
+        if reason:
+            self.rejected[reason] += 1
+        else:
+            self.passed += 1
+        return reason
@@ -0,0 +1,42 @@
+import { NextRequest, NextResponse } from "next/server";
+import { headers } from "next/headers";
+import { and, desc, eq, lt } from "drizzle-orm";
+import { db } from "@/db/drizzle";
+import { utteranceLatency } from "@/db/schema";
+import { auth } from "@/lib/auth";
+import { canReadGuild } from "@/lib/guild-access";
+import { parsePageParams, toPage } from "@/lib/pagination";
+
+// GET /api/conversations/latency?guildId=...&cursor=...&limit=...
+// Newest-first per-utterance stage timings (STT, LLM, TTS) exported by the bot
+export async function GET(request: NextRequest) {
+  const requestHeaders = await headers();
+  const session = await auth.api.getSession({ headers: requestHeaders });
+  if (!session) {
+    return NextResponse.json({ error: "Unauthorized" }, { status: 401 });
+  }
+
+  const page = parsePageParams(request);
+  if (!page) {
+    return NextResponse.json({ error: "guildId is required" }, { status: 400 });
+  }
+
+  if (!(await canReadGuild(session, page.guildId, requestHeaders))) {
+    return NextResponse.json({ error: "Forbidden" }, { status: 403 });
+  }
+
+  const rows = await db
+    .select()
+    .from(utteranceLatency)
+    .where(
+      and(
+        eq(utteranceLatency.guildId, page.guildId),
+        page.cursor ? lt(utteranceLatency.id, page.cursor) : undefined
+      )
+    )
+    .orderBy(desc(utteranceLatency.id))
+    .limit(page.limit + 1);
+
+  const { items, nextCursor } = toPage(rows, page.limit);
+  return NextResponse.json({ latencies: items, nextCursor });
+}
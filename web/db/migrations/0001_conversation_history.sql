@@ -0,0 +1,26 @@
+CREATE TABLE "conversation_turn" (
+	"id" bigserial PRIMARY KEY NOT NULL,
+	"guild_id" text NOT NULL,
+	"utterance_id" bigint,
+	"role" text NOT NULL,
+	"user_id" text,
+	"user_name" text,
+	"content" text NOT NULL,
+	"created_at" timestamp NOT NULL
+);
+--> statement-breakpoint
+CREATE TABLE "utterance_latency" (
+	"id" bigserial PRIMARY KEY NOT NULL,
+	"guild_id" text NOT NULL,
+	"user_id" text NOT NULL,
+	"utterance_id" bigint,
+	"stt_ms" real,
+	"llm_ms" real,
+	"tts_ms" real,
+	"total_ms" real NOT NULL,
+	"draft_hit" boolean DEFAULT false NOT NULL,
+	"created_at" timestamp NOT NULL
+);
+--> statement-breakpoint
+CREATE INDEX "conversation_turn_guild_id_id_idx" ON "conversation_turn" USING btree ("guild_id","id");--> statement-breakpoint
+CREATE INDEX "utterance_latency_guild_id_id_idx" ON "utterance_latency" USING btree ("guild_id","id");
\ No newline at end of file
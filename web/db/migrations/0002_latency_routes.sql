@@ -0,0 +1,3 @@
+ALTER TABLE "utterance_latency" ADD COLUMN "stt_model" text;--> statement-breakpoint
+ALTER TABLE "utterance_latency" ADD COLUMN "chat_model" text;--> statement-breakpoint
+ALTER TABLE "utterance_latency" ADD COLUMN "tts_model" text;
\ No newline at end of file
@@ -1,4 +1,13 @@
-import { pgTable, text, timestamp, boolean } from "drizzle-orm/pg-core";
+import {
+  pgTable,
+  text,
+  timestamp,
+  boolean,
+  bigserial,
+  bigint,
+  real,
+  index,
+} from "drizzle-orm/pg-core";
 
 export const user = pgTable("user", {
   id: text("id").primaryKey(),
@@ -59,3 +68,43 @@ export const verification = pgTable("verification", {
     .$onUpdate(() => /* @__PURE__ */ new Date())
     .notNull(),
 });
+
+// Written by the bot (history_export.py), read by the dashboard
+export const conversationTurn = pgTable(
+  "conversation_turn",
+  {
+    id: bigserial("id", { mode: "number" }).primaryKey(),
+    guildId: text("guild_id").notNull(),
+    utteranceId: bigint("utterance_id", { mode: "number" }),
+    role: text("role").notNull(),
+    userId: text("user_id"),
+    userName: text("user_name"),
+    content: text("content").notNull(),
+    createdAt: timestamp("created_at").notNull(),
+  },
+  (table) => [
+    index("conversation_turn_guild_id_id_idx").on(table.guildId, table.id),
+  ]
+);
+
+export const utteranceLatency = pgTable(
+  "utterance_latency",
+  {
+    id: bigserial("id", { mode: "number" }).primaryKey(),
+    guildId: text("guild_id").notNull(),
+    userId: text("user_id").notNull(),
+    utteranceId: bigint("utterance_id", { mode: "number" }),
+    sttMs: real("stt_ms"),
+    llmMs: real("llm_ms"),
+    ttsMs: real("tts_ms"),
+    totalMs: real("total_ms").notNull(),
+    draftHit: boolean("draft_hit").default(false).notNull(),
+    sttModel: text("stt_model"),
+    chatModel: text("chat_model"),
+    ttsModel: text("tts_model"),
+    createdAt: timestamp("created_at").notNull(),
+  },
+  (table) => [
+    index("utterance_latency_guild_id_id_idx").on(table.guildId, table.id),
+  ]
+);
@@ -22,6 +22,8 @@ export const auth = betterAuth({
     discord: {
       clientId: process.env.DISCORD_CLIENT_ID!,
       clientSecret: process.env.DISCORD_CLIENT_SECRET!,
+      // guild membership gates the conversation history API (lib/guild-access.ts)
+      scope: ["guilds"],
     },
     apple: {
       clientId: process.env.APPLE_CLIENT_ID!,
@@ -0,0 +1,56 @@
+import { auth } from "@/lib/auth";
+
+type Session = NonNullable<Awaited<ReturnType<typeof auth.api.getSession>>>;
+
+const GUILD_CACHE_MS = 60_000;
+
+// userId: guilds of the linked Discord account, cached to stay under Discord's rate limits
+const guildCache = new Map<string, { guildIds: Set<string>; expiresAt: number }>();
+
+// DASHBOARD_ADMIN_EMAILS lists accounts that may read every guild. The email must be
+// verified (i.e. come from a social provider), since email/password signup is open.
+function isAdmin(session: Session) {
+  const admins = (process.env.DASHBOARD_ADMIN_EMAILS ?? "")
+    .split(",")
+    .map((email) => email.trim().toLowerCase())
+    .filter(Boolean);
+  return session.user.emailVerified && admins.includes(session.user.email.toLowerCase());
+}
+
+// Guild ids of the caller's linked Discord account (needs the `guilds` OAuth scope),
+// or null if there is no linked account or Discord refused the token
+async function discordGuildIds(session: Session, requestHeaders: Headers) {
+  const cached = guildCache.get(session.user.id);
+  if (cached && cached.expiresAt > Date.now()) return cached.guildIds;
+
+  let accessToken: string | undefined;
+  try {
+    // Refreshes the token when it has expired
+    ({ accessToken } = await auth.api.getAccessToken({
+      body: { providerId: "discord" },
+      headers: requestHeaders,
+    }));
+  } catch {
+    return null;
+  }
+  if (!accessToken) return null;
+
+  const response = await fetch("https://discord.com/api/v10/users/@me/guilds", {
+    headers: { Authorization: `Bearer ${accessToken}` },
+    cache: "no-store",
+  });
+  if (!response.ok) return null;
+
+  const guilds: { id: string }[] = await response.json();
+  const guildIds = new Set(guilds.map((guild) => guild.id));
+  guildCache.set(session.user.id, { guildIds, expiresAt: Date.now() + GUILD_CACHE_MS });
+  return guildIds;
+}
+
+// Conversation data is only readable by members of the guild (checked through the
+// caller's linked Discord account) and by dashboard admins
+export async function canReadGuild(session: Session, guildId: string, requestHeaders: Headers) {
+  if (isAdmin(session)) return true;
+  const guildIds = await discordGuildIds(session, requestHeaders);
+  return guildIds?.has(guildId) ?? false;
+}
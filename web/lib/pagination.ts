@@ -0,0 +1,36 @@
+import { NextRequest } from "next/server";
+
+const DEFAULT_LIMIT = 50;
+const MAX_LIMIT = 200;
+
+export type PageParams = {
+  guildId: string;
+  cursor: number | null;
+  limit: number;
+};
+
+// Keyset pagination: `cursor` is the id of the last row of the previous page
+export function parsePageParams(request: NextRequest): PageParams | null {
+  const params = request.nextUrl.searchParams;
+  const guildId = params.get("guildId");
+  if (!guildId) return null;
+
+  const cursor = Number(params.get("cursor"));
+  const limit = Number(params.get("limit"));
+
+  return {
+    guildId,
+    cursor: Number.isInteger(cursor) && cursor > 0 ? cursor : null,
+    // Non-integers (e.g. ?limit=2.5) would reach Postgres as LIMIT 3.5 and fail
+    limit: Number.isInteger(limit) && limit > 0 ? Math.min(limit, MAX_LIMIT) : DEFAULT_LIMIT,
+  };
+}
+
+// Callers fetch `limit + 1` rows so we know whether another page exists
+export function toPage<T extends { id: number }>(rows: T[], limit: number) {
+  const items = rows.slice(0, limit);
+  return {
+    items,
+    nextCursor: rows.length > limit ? items[items.length - 1].id : null,
+  };
+}